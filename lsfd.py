@@ -8,11 +8,15 @@ import os
 import sys
 import re
 import pwd
+import csv
+import json
+import time
 import argparse
 import subprocess
+from http.server import HTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Set
-from collections import defaultdict
+from collections import defaultdict, deque, Counter
 
 class FileDescriptorAnalyzer:
     def __init__(self):
@@ -25,8 +29,32 @@ class FileDescriptorAnalyzer:
         self.return_mode = False  
         self.max_usage_mode = False
         self.quiet_mode = False
+        self.all_users = False
         self.target_user = None
 
+        # Output: table, json or csv; Nagios check (critical percentage) or Prometheus exporter
+        self.output_format = 'table'
+        self.nagios_mode = False
+        self.critical = 80
+        self.exporter_port = 0
+        self.cache_ttl = 30
+
+        # Last metrics served, reused by scrapes within cache_ttl (exporter mode)
+        self.metrics_text = None
+        self.metrics_time = 0.0
+
+        # FD type breakdown of the top N reported processes by FD count (0: none)
+        self.breakdown = 0
+        self.breakdown_paths = 5
+
+        # Leak watch mode: sampling interval (seconds), FD count below which a
+        # process is only re-counted once its FD table grew past it, and time
+        # to the soft limit (minutes) under which a process is reported
+        self.watch = 0
+        self.floor = 100
+        self.alert_minutes = 60
+        self.history_size = 10
+
         # System info
         self.current_uid = os.getuid()
         self.current_user = pwd.getpwuid(self.current_uid).pw_name
@@ -35,6 +63,10 @@ class FileDescriptorAnalyzer:
         # Process caches
         self.process_cache = {}
         self.fd_cache = {}
+        self.user_cache = {}
+
+        # FD count samples [(time, fd_count)] by (PID, start time), so a reused PID starts over
+        self.fd_history = {}
 
     def debug_print(self, message: str):
         """Print debug message prefixed with '#' for shell parseability"""
@@ -49,55 +81,52 @@ class FileDescriptorAnalyzer:
             return None
 
     def get_user_from_uid(self, uid: int) -> Optional[str]:
-        """Get username from UID"""
+        """Get username from UID, cached per UID"""
+        if uid not in self.user_cache:
+            try:
+                self.user_cache[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                self.user_cache[uid] = None
+        return self.user_cache[uid]
+
+    def get_processes_by_uid(self) -> Dict[int, List[int]]:
+        """Get process PIDs grouped by owner UID, in one walk of /proc"""
+        uid_processes = defaultdict(list)
         try:
-            return pwd.getpwuid(uid).pw_name
-        except KeyError:
-            return None
+            with os.scandir('/proc') as entries:
+                for entry in entries:
+                    if not entry.name.isdigit():
+                        continue
+                    try:
+                        uid_processes[entry.stat().st_uid].append(int(entry.name))
+                    except (OSError, FileNotFoundError):
+                        continue
+        except OSError:
+            pass
+
+        self.debug_print(f"Found {sum(map(len, uid_processes.values()))} processes "
+                         f"of {len(uid_processes)} users")
+        return {uid: sorted(pids) for uid, pids in uid_processes.items()}
 
     def get_current_users(self) -> Set[str]:
         """Get list of users with active processes"""
-        users = set()
-        try:
-            proc_dirs = [d for d in os.listdir('/proc') if d.isdigit()]
-            for pid in proc_dirs:
-                try:
-                    stat = os.stat(f'/proc/{pid}')
-                    username = self.get_user_from_uid(stat.st_uid)
-                    if username:
-                        users.add(username)
-                except (OSError, FileNotFoundError):
-                    continue
-        except OSError:
-            pass
+        users = set(filter(None, map(self.get_user_from_uid, self.get_processes_by_uid())))
 
         self.debug_print(f"Found active users: {sorted(users)}")
         return users
 
     def get_user_processes(self, username: str) -> List[int]:
         """Get list of process PIDs for a specific user"""
-        processes = []
         target_uid = self.get_uid_from_user(username)
         if target_uid is None:
-            return processes
+            return []
 
         self.debug_print(f"Looking for processes owned by {username} (UID: {target_uid})")
 
-        try:
-            proc_dirs = [d for d in os.listdir('/proc') if d.isdigit()]
-            for pid_str in proc_dirs:
-                try:
-                    pid = int(pid_str)
-                    stat = os.stat(f'/proc/{pid}')
-                    if stat.st_uid == target_uid:
-                        processes.append(pid)
-                except (OSError, ValueError, FileNotFoundError):
-                    continue
-        except OSError:
-            pass
+        processes = self.get_processes_by_uid().get(target_uid, [])
 
         self.debug_print(f"Found {len(processes)} processes for user {username}")
-        return sorted(processes)
+        return processes
 
     def count_file_descriptors(self, pid: int) -> int:
         """Count open file descriptors for a process"""
@@ -106,12 +135,54 @@ class FileDescriptorAnalyzer:
 
         try:
             fd_dir = f'/proc/{pid}/fd'
-            fd_count = len([f for f in os.listdir(fd_dir) if f.isdigit()])
+            # Linux 6.2+ reports the number of open FDs as the directory size, older kernels 0
+            fd_count = os.stat(fd_dir).st_size
+            if fd_count == 0:
+                # Count entries without building a list of names
+                with os.scandir(fd_dir) as entries:
+                    fd_count = sum(1 for _ in entries)
             self.fd_cache[pid] = fd_count
             return fd_count
         except (OSError, FileNotFoundError):
             return 0
 
+    def get_fd_table_size(self, pid: int) -> Optional[int]:
+        """Get FDSize from /proc/PID/status, an upper bound of the open FDs count"""
+        try:
+            with open(f'/proc/{pid}/status', 'r') as f:
+                for line in f:
+                    # "FDSize:\t64"
+                    if line.startswith('FDSize:'):
+                        return int(line.split()[1])
+        except (OSError, FileNotFoundError, ValueError, IndexError):
+            pass
+        return None
+
+    def classify_file_descriptors(self, pid: int) -> Tuple[Counter, Counter]:
+        """Count open FDs of a process by type from their link targets, and regular files by path"""
+        types = Counter()
+        paths = Counter()
+        try:
+            with os.scandir(f'/proc/{pid}/fd') as entries:
+                for entry in entries:
+                    try:
+                        target = os.readlink(entry.path)
+                    except (OSError, FileNotFoundError):
+                        # FD closed meanwhile
+                        continue
+                    if target.startswith('/'):
+                        types['file'] += 1
+                        paths[target] += 1
+                    elif target.startswith('anon_inode:'):
+                        # "anon_inode:[eventfd]", "anon_inode:inotify"
+                        types[target] += 1
+                    else:
+                        # "socket:[12345]", "pipe:[12345]", "net:[4026531840]"
+                        types[target.split(':', 1)[0]] += 1
+        except (OSError, FileNotFoundError):
+            pass
+        return types, paths
+
     def get_process_limits(self, pid: int) -> Tuple[int, int]:
         """Get process file descriptor limits (soft, hard)"""
         try:
@@ -132,6 +203,15 @@ class FileDescriptorAnalyzer:
         # Default limits if unable to read
         return 1024, 4096
 
+    def get_start_time(self, pid: int) -> Optional[str]:
+        """Get process start time (clock ticks since boot) from /proc/PID/stat"""
+        try:
+            with open(f'/proc/{pid}/stat', 'r') as f:
+                # Fields after the command name, which may contain spaces; starttime is field 22
+                return f.read().rsplit(')', 1)[1].split()[19]
+        except (OSError, FileNotFoundError, IndexError):
+            return None
+
     def get_process_command(self, pid: int) -> str:
         """Get process command line"""
         if pid in self.process_cache:
@@ -152,21 +232,43 @@ class FileDescriptorAnalyzer:
         self.process_cache[pid] = cmdline
         return cmdline
 
-    def analyze_process_fd_usage(self, processes: List[int]) -> List[Dict]:
+    def get_process_name(self, pid: int) -> str:
+        """Get process command name (comm), short and bounded unlike the command line"""
+        try:
+            with open(f'/proc/{pid}/comm', 'r') as f:
+                return f.read().strip()
+        except (OSError, FileNotFoundError):
+            return '?'
+
+    def analyze_process_fd_usage(self, processes: List[int], uid: int) -> List[Dict]:
         """Analyze file descriptor usage for a list of processes"""
         results = []
+        skipped = 0
+        username = self.get_user_from_uid(uid) or str(uid)
 
         self.debug_print(f"Analyzing FD usage for {len(processes)} processes")
 
+        # Only the threshold mode can leave out processes that are certainly below it
+        prefilter = not (self.max_usage_mode or self.detailed_mode)
+
         for pid in processes:
             try:
                 # Check if process still exists
                 if not os.path.exists(f'/proc/{pid}'):
                     continue
 
-                fd_count = self.count_file_descriptors(pid)
                 soft_limit, hard_limit = self.get_process_limits(pid)
 
+                if prefilter and soft_limit > 0:
+                    # The FD table size bounds the open FDs: skip the exact
+                    # count when even a full table stays below the threshold
+                    fd_table_size = self.get_fd_table_size(pid)
+                    if fd_table_size is not None and int((fd_table_size / soft_limit) * 100) < self.threshold:
+                        skipped += 1
+                        continue
+
+                fd_count = self.count_file_descriptors(pid)
+
                 # Calculate percentage based on soft limit
                 if soft_limit > 0:
                     percentage = int((fd_count / soft_limit) * 100)
@@ -177,11 +279,14 @@ class FileDescriptorAnalyzer:
 
                 results.append({
                     'pid': pid,
+                    'uid': uid,
+                    'user': username,
                     'fd_count': fd_count,
                     'soft_limit': soft_limit,
                     'hard_limit': hard_limit,
                     'percentage': percentage,
-                    'command': command
+                    'command': command,
+                    'comm': self.get_process_name(pid)
                 })
 
                 self.debug_print(f"PID {pid}: {fd_count}/{soft_limit} FDs ({percentage}%)")
@@ -190,6 +295,8 @@ class FileDescriptorAnalyzer:
                 # Process disappeared
                 continue
 
+        if prefilter:
+            self.debug_print(f"Skipped FD count of {skipped} processes with FDSize below the threshold")
         return results
 
     def filter_results(self, results: List[Dict]) -> List[Dict]:
@@ -225,10 +332,16 @@ class FileDescriptorAnalyzer:
 
         # Print header
         if not self.quiet_mode:
-            print("  PID   USED   SOFT   HARD  PCTUSED  PROCESS")
-
-        # Sort results by PID
-        sorted_results = sorted(results, key=lambda x: x['pid'])
+            if self.all_users:
+                print("  PID USER           USED   SOFT   HARD  PCTUSED  PROCESS")
+            else:
+                print("  PID   USED   SOFT   HARD  PCTUSED  PROCESS")
+
+        # Sort results by PID, grouped by user in all-users mode
+        if self.all_users:
+            sorted_results = sorted(results, key=lambda x: (x['user'], x['pid']))
+        else:
+            sorted_results = sorted(results, key=lambda x: x['pid'])
 
         # Display results
         for result in sorted_results:
@@ -236,38 +349,262 @@ class FileDescriptorAnalyzer:
             soft_display = result['soft_limit'] if result['soft_limit'] < 2147483647 else 'unlim'
             hard_display = result['hard_limit'] if result['hard_limit'] < 2147483647 else 'unlim'
 
-            print(f"{result['pid']:5d} {result['fd_count']:6d} {soft_display:>6} {hard_display:>6} {result['percentage']:3d}% {result['command']}")
+            if self.all_users:
+                print(f"{result['pid']:5d} {result['user']:<12.12s} {result['fd_count']:6d} {soft_display:>6} {hard_display:>6} {result['percentage']:3d}% {result['command']}")
+            else:
+                print(f"{result['pid']:5d} {result['fd_count']:6d} {soft_display:>6} {hard_display:>6} {result['percentage']:3d}% {result['command']}")
 
         return len(results)
 
+    def display_fd_breakdown(self, results: List[Dict]):
+        """Display FD types and most repeated file paths of the top processes by FD count"""
+        top_results = sorted(results, key=lambda x: x['fd_count'], reverse=True)[:self.breakdown]
+        self.debug_print(f"FD type breakdown of {len(top_results)} processes")
+
+        for result in top_results:
+            types, paths = self.classify_file_descriptors(result['pid'])
+            if not self.quiet_mode:
+                print()
+            type_counts = ', '.join(f"{fd_type} {count}" for fd_type, count in types.most_common())
+            print(f"{result['pid']:5d} {result['fd_count']} FDs: {type_counts or 'unreadable'}")
+            for path, count in paths.most_common(self.breakdown_paths):
+                if count > 1:
+                    print(f"{'':5s} {count:6d} {path}")
+
+    def collect_results(self) -> Optional[List[Dict]]:
+        """Analyze and filter the FD usage of the target user, or of every user from one
+        walk of /proc; None if the target user has no processes"""
+        self.debug_print(f"Starting FD analysis for {'all users' if self.all_users else f'user: {self.target_user}'}")
+        self.debug_print(f"Platform: {self.platform}, Current user: {self.current_user}")
+
+        if self.all_users:
+            uid_processes = sorted(self.get_processes_by_uid().items())
+        else:
+            # Get processes for target user
+            processes = self.get_user_processes(self.target_user)
+            if not processes:
+                return None
+            uid_processes = [(self.get_uid_from_user(self.target_user), processes)]
+
+        filtered_results = []
+        for uid, processes in uid_processes:
+            # Analyze FD usage
+            results = self.analyze_process_fd_usage(processes, uid)
+            # Filter results based on mode, per user so max usage mode shows each user's top process
+            filtered_results.extend(self.filter_results(results))
+        return filtered_results
+
+    def display_structured_results(self, results: List[Dict]):
+        """Display the results as JSON or CSV"""
+        fields = ['pid', 'uid', 'user', 'fd_count', 'soft_limit', 'hard_limit', 'percentage', 'command']
+        sorted_results = sorted(results, key=lambda x: x['pid'])
+        if self.output_format == 'json':
+            print(json.dumps([{field: result[field] for field in fields} for result in sorted_results], indent=2))
+        else:
+            writer = csv.DictWriter(sys.stdout, fieldnames=fields, extrasaction='ignore')
+            if not self.quiet_mode:
+                writer.writeheader()
+            writer.writerows(sorted_results)
+
+    def display_nagios(self, results: List[Dict]) -> int:
+        """Display a one line Nagios check result, returning its status code (0 OK, 1 WARNING, 2 CRITICAL)"""
+        max_percentage = max((r['percentage'] for r in results), default=0)
+        if max_percentage >= self.critical:
+            status, code = 'CRITICAL', 2
+        elif results:
+            status, code = 'WARNING', 1
+        else:
+            status, code = 'OK', 0
+
+        if results:
+            top = max(results, key=lambda x: (x['percentage'], x['fd_count']))
+            summary = (f"{len(results)} processes above {self.threshold}%, max {top['percentage']}% "
+                       f"(PID {top['pid']} {top['user']}: {top['fd_count']}/{top['soft_limit']} FDs)")
+        else:
+            summary = f"no process above {self.threshold}%"
+        # Max usage is only known for processes above the warning threshold, 0 otherwise
+        print(f"FD {status} - {summary} | processes={len(results)};;;0 "
+              f"max_usage={max_percentage}%;{self.threshold};{self.critical};0;100")
+        return code
+
+    def format_labels(self, **labels) -> str:
+        """Format Prometheus labels, escaping backslashes, quotes and newlines in values"""
+        escaped = []
+        for key, value in labels.items():
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+
+    def format_prometheus(self, results: List[Dict]) -> str:
+        """Format results as Prometheus text exposition"""
+        lines = []
+        for name, key, help_text in (('lsfd_process_open_fds', 'fd_count', 'Open file descriptors of a process.'),
+                                     ('lsfd_process_fd_soft_limit', 'soft_limit', 'Soft limit of open files of a process.'),
+                                     ('lsfd_process_fd_hard_limit', 'hard_limit', 'Hard limit of open files of a process.')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            for result in sorted(results, key=lambda x: x['pid']):
+                lines.append(f"{name}{self.format_labels(pid=result['pid'], user=result['user'], comm=result['comm'])} "
+                             f"{result[key]}")
+        lines += [
+            '# HELP lsfd_processes_above_threshold Processes using more than the threshold percentage of their soft limit.',
+            '# TYPE lsfd_processes_above_threshold gauge',
+            f"lsfd_processes_above_threshold{self.format_labels(threshold=self.threshold)} "
+            f"{sum(1 for r in results if r['percentage'] >= self.threshold)}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def get_prometheus_metrics(self) -> str:
+        """Get metrics text, rescanning only when the cached one is older than cache_ttl"""
+        now = time.monotonic()
+        if self.metrics_text is None or now - self.metrics_time >= self.cache_ttl:
+            self.process_cache = {}
+            self.fd_cache = {}
+            self.metrics_text = self.format_prometheus(self.collect_results() or [])
+            self.metrics_time = now
+        else:
+            self.debug_print(f"Serving cached metrics ({now - self.metrics_time:.1f}s old)")
+        return self.metrics_text
+
+    def serve_metrics(self):
+        """Serve metrics over HTTP on localhost until interrupted"""
+        MetricsHandler.analyzer = self
+        server = HTTPServer(('127.0.0.1', self.exporter_port), MetricsHandler)
+        print(f"Serving metrics on http://127.0.0.1:{self.exporter_port}/metrics (cache {self.cache_ttl}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
     def run_analysis(self) -> int:
         """Run the file descriptor analysis"""
-        self.debug_print(f"Starting FD analysis for user: {self.target_user}")
-        self.debug_print(f"Platform: {self.platform}, Current user: {self.current_user}")
+        if self.watch:
+            return self.watch_fd_growth()
+
+        if self.exporter_port:
+            self.serve_metrics()
+            return 0
 
-        # Get processes for target user
-        processes = self.get_user_processes(self.target_user)
+        filtered_results = self.collect_results()
 
-        if not processes:
+        if self.nagios_mode:
+            return self.display_nagios(filtered_results or [])
+
+        if self.output_format != 'table':
+            self.display_structured_results(filtered_results or [])
+            return len(filtered_results or [])
+
+        if filtered_results is None:
             if not self.quiet_mode:
                 print(f"No processes found for user {self.target_user}")
             return 0
 
-        # Analyze FD usage
-        results = self.analyze_process_fd_usage(processes)
+        # Display results
+        result_count = self.format_and_display_results(filtered_results)
+        if self.breakdown:
+            self.display_fd_breakdown(filtered_results)
+        return result_count
+
+    def format_duration(self, seconds: float) -> str:
+        """Format a duration as e.g. 2d03h, 5h12m, 7m or 40s"""
+        minutes = int(seconds // 60)
+        if minutes >= 1440:
+            return f"{minutes // 1440}d{minutes % 1440 // 60:02d}h"
+        if minutes >= 60:
+            return f"{minutes // 60}h{minutes % 60:02d}m"
+        if minutes >= 1:
+            return f"{minutes}m"
+        return f"{int(seconds)}s"
+
+    def sample_fd_growth(self, processes: List[Tuple[int, str]]) -> List[Dict]:
+        """Record one FD count sample per process and return those reaching their soft limit soon"""
+        now = time.monotonic()
+        history = {}
+        alerts = []
+        recounted = 0
+
+        # Counts and command lines are taken afresh on every sample: PIDs get reused
+        self.process_cache = {}
+        self.fd_cache = {}
 
-        # Filter results based on mode
-        filtered_results = self.filter_results(results)
+        for pid, username in processes:
+            start_time = self.get_start_time(pid)
+            if start_time is None:
+                continue
+            key = (pid, start_time)
+            samples = self.fd_history.get(key)
+            if samples is None:
+                samples = deque(maxlen=self.history_size)
+            elif samples[-1][1] < self.floor:
+                # Small process: its FD table must grow past the floor before any leak matters
+                fd_table_size = self.get_fd_table_size(pid)
+                if fd_table_size is not None and fd_table_size < self.floor:
+                    history[key] = samples
+                    continue
+            history[key] = samples
 
-        # Display results
-        return self.format_and_display_results(filtered_results)
+            samples.append((now, self.count_file_descriptors(pid)))
+            recounted += 1
+            if len(samples) < 2:
+                continue
+
+            # Growth rate over the kept history
+            (first_time, first_count), (last_time, fd_count) = samples[0], samples[-1]
+            rate = (fd_count - first_count) / (last_time - first_time)
+            if rate <= 0:
+                continue
+            soft_limit, hard_limit = self.get_process_limits(pid)
+            seconds_left = max(soft_limit - fd_count, 0) / rate
+            self.debug_print(f"PID {pid}: {fd_count}/{soft_limit} FDs, {rate * 60:+.1f}/min, "
+                             f"limit in {self.format_duration(seconds_left)}")
+            if seconds_left < self.alert_minutes * 60:
+                alerts.append({
+                    'pid': pid,
+                    'user': username,
+                    'fd_count': fd_count,
+                    'soft_limit': soft_limit,
+                    'rate': rate,
+                    'seconds_left': seconds_left,
+                    'command': self.get_process_command(pid)
+                })
+
+        # Forget exited processes
+        self.fd_history = history
+        self.debug_print(f"Re-counted FDs of {recounted}/{len(history)} processes")
+        return alerts
+
+    def watch_fd_growth(self) -> int:
+        """Sample FD counts every self.watch seconds, reporting processes about to reach their soft limit"""
+        self.debug_print(f"Watching FD growth every {self.watch}s, floor {self.floor} FDs, "
+                         f"alert under {self.alert_minutes} minutes to the soft limit")
+        try:
+            while True:
+                if self.all_users:
+                    processes = [(pid, self.get_user_from_uid(uid) or str(uid))
+                                 for uid, pids in sorted(self.get_processes_by_uid().items()) for pid in pids]
+                else:
+                    processes = [(pid, self.target_user) for pid in self.get_user_processes(self.target_user)]
+
+                for alert in self.sample_fd_growth(processes):
+                    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} ALERT PID {alert['pid']} ({alert['user']}): "
+                          f"{alert['fd_count']}/{alert['soft_limit']} FDs, {alert['rate'] * 60:+.1f}/min, "
+                          f"soft limit in {self.format_duration(alert['seconds_left'])}: {alert['command']}",
+                          flush=True)
+                time.sleep(self.watch)
+        except KeyboardInterrupt:
+            pass
+        return 0
 
     def validate_configuration(self) -> List[str]:
         """Validate configuration and return list of errors"""
         errors = []
 
         # Check if monitoring another user without root privileges
-        if (self.target_user != self.current_user and 
+        if self.all_users and self.current_user != 'root':
+            errors.append(f"Cannot monitor all users processes without being root "
+                         f"(current: {self.current_user})")
+        elif (self.target_user != self.current_user and 
             self.current_user != 'root'):
             errors.append(f"Cannot monitor another user process without being root "
                          f"(current: {self.current_user}, requested: {self.target_user})")
@@ -280,16 +617,62 @@ class FileDescriptorAnalyzer:
             (self.detailed_mode or self.return_mode)):
             errors.append('Mode max usage is exclusive with modes "return" and "detailed"')
 
+        if self.watch and (self.return_mode or self.detailed_mode or self.max_usage_mode):
+            errors.append('Watch mode is exclusive with modes "return", "detailed" and "max usage"')
+
+        if sum(map(bool, (self.watch, self.nagios_mode, self.exporter_port,
+                          self.output_format != 'table', self.breakdown))) > 1:
+            errors.append("Watch, Nagios, exporter, JSON/CSV output and FD type breakdown modes are exclusive")
+
+        if self.nagios_mode and (self.return_mode or self.detailed_mode or self.max_usage_mode):
+            errors.append('Nagios mode is exclusive with modes "return", "detailed" and "max usage"')
+
+        if self.exporter_port and (self.return_mode or self.max_usage_mode):
+            errors.append('Exporter mode is exclusive with modes "return" and "max usage"')
+
+        if self.exporter_port and not (1 <= self.exporter_port <= 65535):
+            errors.append("Exporter port must be in range 1-65535")
+
+        if self.cache_ttl < 0:
+            errors.append("Cache TTL must not be negative")
+
+        if self.nagios_mode and not (self.threshold <= self.critical <= 100):
+            errors.append("Critical threshold must be in range threshold-100")
+
+        if self.watch < 0 or self.floor < 0 or self.alert_minutes < 0 or self.breakdown < 0:
+            errors.append("Watch interval, floor, alert time and breakdown count must not be negative")
+
         # Validate threshold range
         if not (0 <= self.threshold <= 100):
             errors.append("Threshold must be in range 0-100")
 
+        if self.all_users and self.target_user != self.current_user:
+            errors.append("All users mode and a specific user at the same time doesn't make sense")
+
         # Check if target user exists
         if self.get_uid_from_user(self.target_user) is None:
             errors.append(f"Cannot get username for {self.target_user}")
 
         return errors
 
+class MetricsHandler(BaseHTTPRequestHandler):
+    """HTTP handler serving the analyzer metrics in Prometheus text format"""
+    analyzer = None
+
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.analyzer.get_prometheus_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.analyzer.debug_print(f"{self.address_string()} {format % args}")
+
 def main():
     parser = argparse.ArgumentParser(
         description=f"Unix File descriptor usage checker v{FileDescriptorAnalyzer().version}",
@@ -300,6 +683,12 @@ Examples:
   %(prog)s -u root            # Check FD usage for root user  
   %(prog)s -t 50 -d           # Detailed view with 50%% threshold
   %(prog)s -m                 # Show only max usage process
+  %(prog)s -d -b 3            # Show FD types of the 3 processes with most FDs
+  %(prog)s -a -m              # Show the max usage process of every user
+  %(prog)s -a -w 60 -A 120    # Alert on processes reaching their limit within 2 hours
+  %(prog)s -a -d -o json      # Show FD usage of all processes as JSON
+  %(prog)s -a --nagios -c 90  # Nagios check: WARNING over 30%%, CRITICAL over 90%%
+  %(prog)s -a --exporter 9107 # Serve Prometheus metrics on localhost:9107
   %(prog)s --debug            # Show with debug information
         """
     )
@@ -313,6 +702,9 @@ Examples:
     parser.add_argument('-u', '--user', metavar='USER',
                        help='Display the user FD usage (default: current user)')
 
+    parser.add_argument('-a', '--all-users', action='store_true',
+                       help='Display the FD usage of all users, from a single scan of the processes')
+
     parser.add_argument('-r', '--return-mode', action='store_true',
                        help='Return mode - exit with count of processes above threshold')
 
@@ -322,6 +714,33 @@ Examples:
     parser.add_argument('-q', '--quiet', action='store_true',
                        help="Quiet mode - don't display headers or information, only process list")
 
+    parser.add_argument('-b', '--breakdown', type=int, default=0, metavar='N',
+                       help='Show FD types (socket, pipe, anon_inode, file...) and most repeated files of the top N displayed processes by FD count')
+
+    parser.add_argument('-w', '--watch', type=int, default=0, metavar='SECONDS',
+                       help='Watch mode - sample FD counts every SECONDS and alert on processes about to reach their soft limit')
+
+    parser.add_argument('-A', '--alert-minutes', type=int, default=60, metavar='MIN',
+                       help='Watch mode - alert when the soft limit will be reached within MIN minutes at the current growth rate (default: 60)')
+
+    parser.add_argument('-f', '--floor', type=int, default=100, metavar='FDS',
+                       help='Watch mode - only re-count processes below FDS open files once their FD table grew past it (default: 100)')
+
+    parser.add_argument('-o', '--output', choices=['table', 'json', 'csv'], default='table',
+                       help='Output format (default: table); quiet mode drops the CSV header')
+
+    parser.add_argument('--nagios', action='store_true',
+                       help='Nagios check mode - one status line with perfdata, exit 1 over the threshold, 2 over the critical threshold and 3 on errors')
+
+    parser.add_argument('-c', '--critical', type=int, default=80, metavar='PCT',
+                       help='Nagios check mode - critical threshold percentage (default: 80)')
+
+    parser.add_argument('--exporter', type=int, default=0, metavar='PORT',
+                       help='Serve the processes above the threshold (all with -d) in Prometheus text format on localhost:PORT')
+
+    parser.add_argument('--cache-ttl', type=int, default=30, metavar='SECONDS',
+                       help='With --exporter, reuse the last scan for scrapes within SECONDS (default: 30)')
+
     parser.add_argument('--debug', action='store_true',
                        help='Enable debug output showing analysis details (prefixed with #)')
 
@@ -335,6 +754,16 @@ Examples:
     analyzer.return_mode = args.return_mode
     analyzer.max_usage_mode = args.max_usage
     analyzer.quiet_mode = args.quiet
+    analyzer.all_users = args.all_users
+    analyzer.breakdown = args.breakdown
+    analyzer.output_format = args.output
+    analyzer.nagios_mode = args.nagios
+    analyzer.critical = args.critical
+    analyzer.exporter_port = args.exporter
+    analyzer.cache_ttl = args.cache_ttl
+    analyzer.watch = args.watch
+    analyzer.alert_minutes = args.alert_minutes
+    analyzer.floor = args.floor
 
     # Set target user (default to current user)
     if args.user:
@@ -345,6 +774,10 @@ Examples:
     # Validate configuration
     errors = analyzer.validate_configuration()
     if errors:
+        if analyzer.nagios_mode:
+            # Nagios reads the first stdout line, and 3 is UNKNOWN
+            print(f"FD UNKNOWN - {'; '.join(errors)}")
+            sys.exit(3)
         print("Errors occurred:", file=sys.stderr)
         for error in errors:
             print(f"  {error}", file=sys.stderr)
@@ -354,8 +787,8 @@ Examples:
     try:
         result_count = analyzer.run_analysis()
 
-        # Return mode: exit with count
-        if analyzer.return_mode:
+        # Return mode: exit with count, Nagios mode: exit with status
+        if analyzer.return_mode or analyzer.nagios_mode:
             sys.exit(result_count)
         else:
             sys.exit(0)
@@ -366,6 +799,9 @@ Examples:
     except Exception as e:
         if analyzer.debug:
             raise
+        elif analyzer.nagios_mode:
+            print(f"FD UNKNOWN - {e}")
+            sys.exit(3)
         else:
             print(f"Error: {e}", file=sys.stderr)
             sys.exit(1)
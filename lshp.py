@@ -7,8 +7,11 @@
 import os
 import sys
 import re
-import glob
+import time
+import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from collections import defaultdict
@@ -16,6 +19,11 @@ from collections import defaultdict
 class HugePagesAnalyzer:
     def __init__(self):
         self.debug = False
+        self.watch = 0
+        self.json_output = False
+        self.exporter_port = 0
+        self.cache_ttl = 30
+        self.jobs = 1
         self.print_pattern = "%-38s %-10s : %s %s"
         self.index = 0
         self.grand_total_kb = 0
@@ -26,9 +34,30 @@ class HugePagesAnalyzer:
             (1048576, "1Gb Static HugePages")
         ]
 
+        # Base page size, mappings with a larger kernel page size are hugetlb
+        self.base_page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+
         # KVM process names that should show guest names
         self.kvm_processes = ['qemu-kvm', 'qemu-system-x86_64', 'qemu-system-x86']
 
+        # Per-run process metadata, from one read of /proc/PID/status each
+        self.status_fields = ('Name', 'PPid', 'HugetlbPages')
+        self.process_cache = {}
+
+        # Per-PID state kept across samples (watch mode)
+        self.pid_hugetlb = {}
+        self.prev_pid_vmas = {}
+
+        # Results of the last scan besides per-PID totals, by page size:
+        # shared segments {(dev, inode): {'ranges', 'pids', 'size_kb'}} and private kB by PID
+        self.size_segments = {}
+        self.size_private = {}
+        self.system_counters = {}
+
+        # Last metrics served, reused by scrapes within cache_ttl (exporter mode)
+        self.metrics_text = None
+        self.metrics_time = 0.0
+
     def debug_print(self, message: str):
         """Print debug message prefixed with '#' for shell parseability"""
         if self.debug:
@@ -48,90 +77,211 @@ class HugePagesAnalyzer:
                 print(f"Please run {sys.argv[0]} as root!")
                 sys.exit(127)
 
-    def find_hugepage_processes(self, kernel_page_size: int) -> List[str]:
-        """Find processes using specific hugepage size"""
-        self.debug_print(f"Searching for processes using {kernel_page_size} kB hugepages")
+    def read_hugepage_vmas(self, pid: str) -> Dict[int, Dict]:
+        """Collect hugetlb mappings by page size for a PID in one streaming pass over its smaps
 
+        Returns {page_kb: {'private_kb': kB, 'shared': {(dev, inode): [(start_kb, end_kb), ...]}}}
+        where shared ranges are offsets in the backing hugetlbfs file.
+        """
+        size_vmas = {}
+        vma_header = None
+        vma_size_kb = 0
+        with open(f'/proc/{pid}/smaps', 'r') as f:
+            for line in f:
+                # VMA header: "7f0000000000-7f0040000000 rw-s 00000000 00:10 1234   /dev/hugepages/x",
+                # the only lines starting with a (lowercase hex) digit rather than a field name
+                if line[0] in '0123456789abcdef':
+                    vma_header = line.split(None, 5)
+                # Each VMA reports "Size:" before "KernelPageSize:"; only
+                # hugetlb mappings have a kernel page size above the base one
+                elif line.startswith('Size:'):
+                    vma_size_kb = int(line.split()[1])
+                elif line.startswith('KernelPageSize:'):
+                    page_kb = int(line.split()[1])
+                    if page_kb <= self.base_page_kb:
+                        continue
+                    vmas = size_vmas.setdefault(page_kb, {'private_kb': 0, 'shared': {}})
+                    perms, offset, dev, inode = vma_header[1:5]
+                    if perms[3] == 's':
+                        start_kb = int(offset, 16) // 1024
+                        vmas['shared'].setdefault((dev, inode), []).append((start_kb, start_kb + vma_size_kb))
+                    else:
+                        vmas['private_kb'] += vma_size_kb
+        return size_vmas
+
+    def merged_size_kb(self, ranges: List[Tuple[int, int]]) -> int:
+        """Size covered by a list of (start, end) ranges, counting overlaps once"""
+        total_kb = 0
+        covered_end = None
+        for start, end in sorted(ranges):
+            if covered_end is not None and start < covered_end:
+                start = covered_end
+            if end > start:
+                total_kb += end - start
+                covered_end = end
+        return total_kb
+
+    def read_hugetlb_status_kb(self, pid: str) -> Optional[int]:
+        """Get HugetlbPages from /proc/PID/status, None if the kernel doesn't report it"""
+        info = self.get_process_info(pid)
+        if info is None:
+            raise OSError(f"Cannot read /proc/{pid}/status")
+        # "HugetlbPages:    2097152 kB" (Linux 4.4+)
+        if 'HugetlbPages' not in info:
+            return None
+        return int(info['HugetlbPages'].split()[0])
+
+    def read_pid_hugepage_vmas(self, pid: str) -> Optional[Dict[int, Dict]]:
+        """Hugetlb mappings by page size for a PID, None if it disappeared or is inaccessible"""
         try:
-            # Find all smaps files
-            smaps_files = glob.glob('/proc/*/smaps')
-            hugepage_processes = []
-
-            for smaps_file in smaps_files:
-                try:
-                    with open(smaps_file, 'r') as f:
-                        content = f.read()
-                        if f'KernelPageSize:     {kernel_page_size} kB' in content:
-                            hugepage_processes.append(smaps_file)
-                except (IOError, OSError):
-                    # Process may have disappeared or be inaccessible
-                    continue
-
-            self.debug_print(f"Found {len(hugepage_processes)} processes using {kernel_page_size} kB hugepages")
-            return hugepage_processes
+            return self.read_hugepage_vmas(pid)
+        except (IOError, OSError, ValueError, IndexError, TypeError):
+            return None
+
+    def scan_hugepage_processes(self) -> Dict[int, Dict[str, int]]:
+        """Find processes using hugepages, with their totals in kB by page size and PID"""
+        self.debug_print(f"Scanning processes for hugepages of all sizes ({self.jobs} jobs)")
+        size_pid_totals = defaultdict(dict)
+        skipped = 0
+        seen_pids = {}
+        pid_vmas = {}
+
+        # Shared hugetlbfs segments and private mappings, by page size
+        self.size_segments = defaultdict(dict)
+        self.size_private = defaultdict(dict)
+
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                # Cheap status counter first: only parse smaps of processes
+                # holding hugetlb pages to get the split per page size
+                hugetlb_kb = self.read_hugetlb_status_kb(pid)
+            except (IOError, OSError, ValueError, IndexError):
+                # Process may have disappeared or be inaccessible
+                continue
+            if hugetlb_kb == 0:
+                skipped += 1
+                continue
+            seen_pids[pid] = hugetlb_kb
+            if (self.watch and hugetlb_kb is not None
+                    and self.pid_hugetlb.get(pid) == hugetlb_kb and pid in self.prev_pid_vmas):
+                # Unchanged since the last sample, reuse its mappings
+                pid_vmas[pid] = self.prev_pid_vmas[pid]
+                skipped += 1
+            else:
+                pid_vmas[pid] = None
+
+        pids = [pid for pid, size_vmas in pid_vmas.items() if size_vmas is None]
+        if self.jobs > 1:
+            # Largest hugetlb users first, so their slow smaps reads don't end up last on one
+            # worker; each worker streams its file down to a few totals, keeping memory flat
+            pids.sort(key=lambda pid: seen_pids[pid] or 0, reverse=True)
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                pid_vmas.update(zip(pids, executor.map(self.read_pid_hugepage_vmas, pids)))
+        else:
+            pid_vmas.update(zip(pids, map(self.read_pid_hugepage_vmas, pids)))
 
-        except Exception as e:
-            self.debug_print(f"Error finding hugepage processes: {e}")
-            return []
+        for pid, size_vmas in list(pid_vmas.items()):
+            if size_vmas is None:
+                # Process may have disappeared or be inaccessible
+                del pid_vmas[pid], seen_pids[pid]
+                continue
 
-    def extract_hugepage_info(self, smaps_files: List[str], kernel_page_size: int) -> Dict[str, int]:
-        """Extract hugepage information from smaps files, grouped by PID"""
-        pid_totals = defaultdict(int)
+            # Shared segments are keyed on their backing inode, so they are
+            # counted once system-wide whichever processes map them
+            for page_kb, vmas in size_vmas.items():
+                shared_kb = 0
+                for key, ranges in vmas['shared'].items():
+                    segment = self.size_segments[page_kb].setdefault(key, {'ranges': [], 'pids': []})
+                    segment['ranges'].extend(ranges)
+                    segment['pids'].append(pid)
+                    shared_kb += self.merged_size_kb(ranges)
+                self.size_private[page_kb][pid] = vmas['private_kb']
+                size_pid_totals[page_kb][pid] = vmas['private_kb'] + shared_kb
+                self.debug_print(f"PID {pid}: {vmas['private_kb']} kB private, {shared_kb} kB shared "
+                                 f"({page_kb} kB hugepages)")
+
+        for segments in self.size_segments.values():
+            for segment in segments.values():
+                segment['size_kb'] = self.merged_size_kb(segment['ranges'])
+
+        if self.watch:
+            # Forget exited processes, so a reused PID is always rescanned
+            self.pid_hugetlb = seen_pids
+            self.prev_pid_vmas = pid_vmas
+
+        self.debug_print(f"Skipped smaps of {skipped} processes without (changed) HugetlbPages")
+        for page_kb, pid_totals in size_pid_totals.items():
+            self.debug_print(f"Found {len(pid_totals)} processes using {page_kb} kB hugepages")
+        return dict(size_pid_totals)
+
+    def read_system_counters(self) -> Dict[str, int]:
+        """Read system-wide hugepage counters from /proc/vmstat, khugepaged and the hugetlb pools"""
+        counters = {}
+        try:
+            with open('/proc/vmstat', 'r') as f:
+                for line in f:
+                    key, value = line.split()
+                    if key.startswith(('htlb_', 'thp_collapse_alloc')):
+                        counters[key] = int(value)
+        except (IOError, OSError, ValueError):
+            pass
 
-        for smaps_file in smaps_files:
+        for name in ('pages_collapsed', 'full_scans'):
             try:
-                with open(smaps_file, 'r') as f:
-                    lines = f.readlines()
+                with open(f'/sys/kernel/mm/transparent_hugepage/khugepaged/{name}', 'r') as f:
+                    counters[f'khugepaged_{name}'] = int(f.read())
+            except (IOError, OSError, ValueError):
+                pass
 
-                # Extract PID from path: /proc/1234/smaps -> 1234
-                pid_match = re.search(r'/proc/(\d+)/smaps', smaps_file)
-                if not pid_match:
-                    continue
-                pid = pid_match.group(1)
-
-                # Find KernelPageSize lines and extract the Size from 11 lines before
-                for i, line in enumerate(lines):
-                    if f'KernelPageSize:     {kernel_page_size} kB' in line:
-                        # Look back up to 11 lines for Size entry
-                        for j in range(max(0, i-11), i):
-                            if lines[j].startswith('Size:'):
-                                # Extract size from "Size:           2048 kB"
-                                size_match = re.match(r'Size:\s+(\d+)\s+kB', lines[j])
-                                if size_match:
-                                    size_kb = int(size_match.group(1))
-                                    pid_totals[pid] += size_kb
-                                    self.debug_print(f"PID {pid}: +{size_kb} kB ({kernel_page_size} kB hugepages)")
+        for kernel_page_size, _ in self.hugepage_sizes:
+            try:
+                with open(f'/sys/kernel/mm/hugepages/hugepages-{kernel_page_size}kB/free_hugepages', 'r') as f:
+                    counters[f'free_hugepages_{self.format_hugepage_size(kernel_page_size)}'] = int(f.read())
+            except (IOError, OSError, ValueError):
+                pass
+        return counters
+
+    def get_process_info(self, pid: str) -> Optional[Dict[str, str]]:
+        """Get status fields for a PID from a single read of /proc/PID/status, cached per run"""
+        if pid not in self.process_cache:
+            info = None
+            try:
+                with open(f'/proc/{pid}/status', 'r') as f:
+                    info = {}
+                    for line in f:
+                        key, _, value = line.partition(':')
+                        if key in self.status_fields:
+                            info[key] = value.strip()
+                            if len(info) == len(self.status_fields):
                                 break
-
             except (IOError, OSError):
-                continue
-
-        self.debug_print(f"Found {len(pid_totals)} processes using {kernel_page_size} kB hugepages")
-        return dict(pid_totals)
+                # Process may have disappeared or be inaccessible
+                info = None
+            self.process_cache[pid] = info
+        return self.process_cache[pid]
 
     def get_process_name(self, pid: str) -> Optional[str]:
         """Get process name from /proc/PID/status"""
-        try:
-            with open(f'/proc/{pid}/status', 'r') as f:
-                for line in f:
-                    if line.startswith('Name:'):
-                        return line.split()[1]
-        except (IOError, OSError):
-            pass
-        return None
+        info = self.get_process_info(pid)
+        return info.get('Name') if info else None
 
     def get_ppid(self, pid: str) -> Optional[str]:
         """Get parent PID from /proc/PID/status"""
-        try:
-            with open(f'/proc/{pid}/status', 'r') as f:
-                for line in f:
-                    if line.startswith('PPid:'):
-                        return line.split()[1]
-        except (IOError, OSError):
-            pass
-        return None
+        info = self.get_process_info(pid)
+        return info.get('PPid') if info else None
 
     def get_guest_name(self, pid: str) -> str:
+        """Get guest name of a KVM process, read from its cmdline on first use"""
+        info = self.get_process_info(pid)
+        if info is None:
+            return ""
+        if 'Guest' not in info:
+            info['Guest'] = self.read_guest_name(pid)
+        return info['Guest']
+
+    def read_guest_name(self, pid: str) -> str:
         """Extract guest name from KVM process cmdline"""
         try:
             with open(f'/proc/{pid}/cmdline', 'rb') as f:
@@ -174,6 +324,11 @@ class HugePagesAnalyzer:
 
         return display_name, f"({pid})", formatted_size, hugepage_display
 
+    def format_delta(self, delta_kb: int) -> str:
+        """Format a signed size change for display"""
+        sign = '+' if delta_kb >= 0 else '-'
+        return f"{sign}{self.format_size_display(abs(delta_kb))}"
+
     def format_size_display(self, size_kb: int) -> str:
         """Format size for consistent display"""
         if size_kb >= 1024 * 1024:  # >= 1GB
@@ -202,20 +357,17 @@ class HugePagesAnalyzer:
         else:
             return f"{size_kb}KB"
 
-    def process_hugepage_size(self, kernel_page_size: int, description: str):
+    def section_total_kb(self, kernel_page_size: int) -> int:
+        """Hugepages in use for a page size: private mappings plus each shared segment once"""
+        private_kb = sum(self.size_private.get(kernel_page_size, {}).values())
+        shared_kb = sum(segment['size_kb'] for segment in self.size_segments.get(kernel_page_size, {}).values())
+        return private_kb + shared_kb
+
+    def process_hugepage_size(self, kernel_page_size: int, description: str,
+                              pid_totals: Dict[str, int]):
         """Process and display hugepage information for a specific size"""
         self.debug_print(f"=== Processing {description} ===")
 
-        # Find processes using this hugepage size
-        smaps_files = self.find_hugepage_processes(kernel_page_size)
-
-        if not smaps_files:
-            print(f"#### No {description} found!")
-            return
-
-        # Extract hugepage information (grouped by PID)
-        pid_totals = self.extract_hugepage_info(smaps_files, kernel_page_size)
-
         if not pid_totals:
             print(f"#### No {description} found!")
             return
@@ -225,56 +377,26 @@ class HugePagesAnalyzer:
 
         print(self.print_pattern % (f"# [procname] ({description})", "PID", "Total HP", "Usage"))
 
-        # Group by parent process to avoid double-counting shared memory.
-        # E.g. PostgreSQL's postmaster forks N backends that all map the
-        # same shared_buffers segment; without grouping, each child's
-        # smaps reports the full segment size, inflating the total.
-        pid_set = set(pid_totals.keys())
-        pid_ppid = {}
-        pid_name = {}
-
-        for pid in list(pid_set):
-            if not os.path.exists(f'/proc/{pid}/status'):
-                pid_set.discard(pid)
-                continue
-            pid_ppid[pid] = self.get_ppid(pid)
-            name = self.get_process_name(pid)
-            if name is None:
-                pid_set.discard(pid)
-                continue
-            pid_name[pid] = name
-
-        groups = {}
-        for pid in pid_set:
-            ppid = pid_ppid.get(pid)
-            if ppid in pid_set:
-                if ppid not in groups:
-                    groups[ppid] = {'children': []}
-                groups[ppid]['children'].append(pid)
-            else:
-                if pid not in groups:
-                    groups[pid] = {'children': []}
-
+        # Each row shows what a process maps. Shared hugetlbfs segments
+        # (e.g. PostgreSQL's shared_buffers mapped by every backend) show in
+        # each row but are counted once in the total, by backing inode.
+        private = self.size_private.get(kernel_page_size, {})
         results = []
-        section_total_kb = 0
 
-        for leader_pid, group in groups.items():
-            if leader_pid not in pid_name:
+        for pid, total_kb in pid_totals.items():
+            process_name = self.get_process_name(pid)
+            if process_name is None:
                 continue
 
-            process_name = pid_name[leader_pid]
-            total_kb = pid_totals.get(leader_pid, 0)
-            child_count = len(group['children'])
-
             display_name, pid_display, formatted_size, hugepage_display = self.format_process_info(
-                leader_pid, process_name, total_kb, kernel_page_size)
+                pid, process_name, total_kb, kernel_page_size)
 
-            if child_count > 0:
-                hugepage_display += f" (+ {child_count} children sharing)"
+            shared_kb = total_kb - private.get(pid, 0)
+            if shared_kb > 0:
+                hugepage_display += f" ({self.format_size_display(shared_kb)} shared)"
 
             result_line = self.print_pattern % (display_name, pid_display, formatted_size, hugepage_display)
             results.append((total_kb, result_line))
-            section_total_kb += total_kb
 
         # Sort by total KB (descending)
         results.sort(key=lambda x: x[0], reverse=True)
@@ -286,6 +408,13 @@ class HugePagesAnalyzer:
         # Display section total
         if results:
             print("-" * 60)
+            segments = self.size_segments.get(kernel_page_size, {})
+            if segments:
+                shared_total_kb = sum(segment['size_kb'] for segment in segments.values())
+                print(self.print_pattern % (f"SHARED ({hugepage_size_display})", "",
+                                           self.format_size_display(shared_total_kb),
+                                           f"{len(segments)} segments counted once"))
+            section_total_kb = self.section_total_kb(kernel_page_size)
             section_total_display = self.format_size_display(section_total_kb)
             section_total_pages = section_total_kb // kernel_page_size
             print(self.print_pattern % (f"TOTAL ({hugepage_size_display})", "", 
@@ -296,17 +425,139 @@ class HugePagesAnalyzer:
 
         return 0
 
+    def collect_results(self, size_pid_totals: Dict[int, Dict[str, int]]) -> Dict:
+        """Build per-PID, per-segment and per-page-size hugepage usage in kB, with guest names"""
+        page_sizes = []
+        for kernel_page_size, description in self.hugepage_sizes:
+            pid_totals = size_pid_totals.get(kernel_page_size, {})
+            private = self.size_private.get(kernel_page_size, {})
+
+            processes = []
+            for pid in sorted(pid_totals, key=int):
+                info = self.get_process_info(pid)
+                if info is None or 'Name' not in info:
+                    continue
+                ppid = info.get('PPid')
+                processes.append({
+                    'pid': int(pid),
+                    'ppid': int(ppid) if ppid else None,
+                    'name': info['Name'],
+                    'guest': self.get_guest_name(pid) if info['Name'] in self.kvm_processes else "",
+                    'hugepages_kb': pid_totals[pid],
+                    'private_kb': private.get(pid, 0),
+                })
+
+            segments = []
+            for (dev, inode), segment in sorted(self.size_segments.get(kernel_page_size, {}).items()):
+                segments.append({
+                    'dev': dev,
+                    'inode': int(inode),
+                    'size_kb': segment['size_kb'],
+                    'pids': sorted(int(pid) for pid in segment['pids']),
+                })
+
+            page_sizes.append({
+                'page_size_kb': kernel_page_size,
+                'description': description,
+                'processes': processes,
+                'segments': segments,
+                'total_kb': self.section_total_kb(kernel_page_size),
+            })
+
+        return {
+            'page_sizes': page_sizes,
+            'total_kb': sum(page_size['total_kb'] for page_size in page_sizes),
+        }
+
+    def format_labels(self, **labels) -> str:
+        """Format Prometheus labels, escaping backslashes, quotes and newlines in values"""
+        escaped = []
+        for key, value in labels.items():
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+
+    def format_prometheus(self, results: Dict) -> str:
+        """Format collected results as Prometheus text exposition, sizes in bytes"""
+        process_lines = [
+            '# HELP lshp_process_hugepages_bytes Static hugepages mapped by a process.',
+            '# TYPE lshp_process_hugepages_bytes gauge',
+        ]
+        private_lines = [
+            '# HELP lshp_process_private_hugepages_bytes Static hugepages privately mapped by a process.',
+            '# TYPE lshp_process_private_hugepages_bytes gauge',
+        ]
+        segment_lines = [
+            '# HELP lshp_segment_hugepages_bytes Static hugepages of a shared hugetlbfs segment, counted once.',
+            '# TYPE lshp_segment_hugepages_bytes gauge',
+        ]
+        total_lines = [
+            '# HELP lshp_hugepages_bytes Static hugepages used by all processes.',
+            '# TYPE lshp_hugepages_bytes gauge',
+        ]
+        for page_size in results['page_sizes']:
+            size_label = self.format_hugepage_size(page_size['page_size_kb'])
+            for proc in page_size['processes']:
+                proc_labels = self.format_labels(pid=proc['pid'], name=proc['name'], guest=proc['guest'],
+                                                 page_size=size_label)
+                process_lines.append(f"lshp_process_hugepages_bytes{proc_labels} {proc['hugepages_kb'] * 1024}")
+                private_lines.append(f"lshp_process_private_hugepages_bytes{proc_labels} {proc['private_kb'] * 1024}")
+            for segment in page_size['segments']:
+                segment_lines.append(
+                    f"lshp_segment_hugepages_bytes"
+                    f"{self.format_labels(dev=segment['dev'], inode=segment['inode'], processes=len(segment['pids']), page_size=size_label)} "
+                    f"{segment['size_kb'] * 1024}")
+            total_lines.append(f"lshp_hugepages_bytes{self.format_labels(page_size=size_label)} "
+                               f"{page_size['total_kb'] * 1024}")
+        return '\n'.join(process_lines + private_lines + segment_lines + total_lines) + '\n'
+
+    def get_prometheus_metrics(self) -> str:
+        """Get metrics text, rescanning only when the cached one is older than cache_ttl"""
+        now = time.monotonic()
+        if self.metrics_text is None or now - self.metrics_time >= self.cache_ttl:
+            self.process_cache = {}
+            self.metrics_text = self.format_prometheus(self.collect_results(self.scan_hugepage_processes()))
+            self.metrics_time = now
+        else:
+            self.debug_print(f"Serving cached metrics ({now - self.metrics_time:.1f}s old)")
+        return self.metrics_text
+
+    def serve_metrics(self):
+        """Serve metrics over HTTP on localhost until interrupted"""
+        MetricsHandler.analyzer = self
+        server = HTTPServer(('127.0.0.1', self.exporter_port), MetricsHandler)
+        print(f"Serving metrics on http://127.0.0.1:{self.exporter_port}/metrics (cache {self.cache_ttl}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
     def run(self):
         """Main execution function"""
         self.check_root_privileges()
 
+        if self.exporter_port:
+            self.serve_metrics()
+            return
+
         self.debug_print("Starting hugepage analysis")
 
         sections_with_data = 0
 
+        # Read every smaps once for all hugepage sizes (grouped by size and PID)
+        size_pid_totals = self.scan_hugepage_processes()
+        self.system_counters = self.read_system_counters()
+
+        if self.json_output:
+            print(json.dumps(self.collect_results(size_pid_totals), indent=2))
+            return
+
         # Process each hugepage size
         for kernel_page_size, description in self.hugepage_sizes:
-            section_total = self.process_hugepage_size(kernel_page_size, description)
+            section_total = self.process_hugepage_size(
+                kernel_page_size, description, size_pid_totals.get(kernel_page_size, {}))
             if section_total and section_total > 0:
                 sections_with_data += 1
 
@@ -320,6 +571,69 @@ class HugePagesAnalyzer:
         total_display = self.format_size_display(self.grand_total_kb) if self.grand_total_kb > 0 else '0 kB'
         self.debug_print(f"Hugepage analysis completed: {total_display} total")
 
+        if self.watch:
+            self.watch_changes(size_pid_totals)
+
+    def watch_changes(self, size_pid_totals: Dict[int, Dict[str, int]]):
+        """Resample every self.watch seconds, printing per-PID and system-wide changes"""
+        try:
+            while True:
+                time.sleep(self.watch)
+                # Status fields (and HugetlbPages) are refreshed for every sample
+                self.process_cache = {}
+                prev_totals, size_pid_totals = size_pid_totals, self.scan_hugepage_processes()
+                prev_counters, self.system_counters = self.system_counters, self.read_system_counters()
+                self.display_changes(prev_totals, size_pid_totals, prev_counters, self.system_counters)
+        except KeyboardInterrupt:
+            pass
+
+    def display_changes(self, prev_totals: Dict[int, Dict[str, int]], size_pid_totals: Dict[int, Dict[str, int]],
+                        prev_counters: Dict[str, int], counters: Dict[str, int]):
+        """Display per-PID hugepage deltas and system counter deltas between two samples"""
+        # Shared segments counted once, as in the table TOTAL
+        total_kb = sum(self.section_total_kb(kernel_page_size) for kernel_page_size in size_pid_totals)
+        print(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}: {self.format_size_display(total_kb)} total HP")
+
+        changes = []
+        for kernel_page_size in sorted(set(prev_totals) | set(size_pid_totals)):
+            prev_pid_totals = prev_totals.get(kernel_page_size, {})
+            pid_totals = size_pid_totals.get(kernel_page_size, {})
+            for pid in set(prev_pid_totals) | set(pid_totals):
+                delta_kb = pid_totals.get(pid, 0) - prev_pid_totals.get(pid, 0)
+                if delta_kb:
+                    changes.append((delta_kb, pid, kernel_page_size, pid_totals.get(pid, 0)))
+        changes.sort(key=lambda x: abs(x[0]), reverse=True)
+
+        for delta_kb, pid, kernel_page_size, pid_total_kb in changes:
+            process_name = self.get_process_name(pid) or "(exited)"
+            display_name, pid_display, formatted_size, _ = self.format_process_info(
+                pid, process_name, pid_total_kb, kernel_page_size)
+            print(self.print_pattern % (display_name, pid_display, formatted_size,
+                                        f"{self.format_delta(delta_kb)} ({self.format_hugepage_size(kernel_page_size)})"))
+
+        counter_deltas = [f"{key} {counters[key] - prev_counters[key]:+d}"
+                          for key in sorted(counters)
+                          if key in prev_counters and counters[key] != prev_counters[key]]
+        print(f"# counters: {', '.join(counter_deltas) if counter_deltas else 'no change'}")
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """HTTP handler serving the analyzer metrics in Prometheus text format"""
+    analyzer = None
+
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.analyzer.get_prometheus_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.analyzer.debug_print(f"{self.address_string()} {format % args}")
+
 def main():
     parser = argparse.ArgumentParser(
         description="List hugepages in use on Linux systems",
@@ -328,17 +642,49 @@ def main():
 Examples:
   %(prog)s                    # Show hugepage usage
   %(prog)s --debug            # Show with debug information
+  %(prog)s --watch 5          # Show hugepage changes every 5 seconds
+  %(prog)s --json             # Show hugepage usage as JSON
+  %(prog)s --jobs 8           # Read smaps of 8 processes in parallel
+  %(prog)s --exporter 9106    # Serve Prometheus metrics on localhost:9106
         """
     )
 
     parser.add_argument('--debug', action='store_true',
                        help='Enable debug output showing analysis details (prefixed with #)')
+    parser.add_argument('--watch', type=int, metavar='N', default=0,
+                       help='Resample every N seconds, showing per-PID and hugepage counter changes')
+
+    parser.add_argument('--json', action='store_true',
+                       help='Output per-PID, per-segment and per-page-size hugepage usage in kB as JSON')
+    parser.add_argument('--exporter', type=int, metavar='PORT', default=0,
+                       help='Serve metrics in Prometheus text format on localhost:PORT')
+    parser.add_argument('--cache-ttl', type=int, metavar='SECONDS', default=30,
+                       help='With --exporter, reuse the last scan for scrapes within SECONDS (default: 30)')
+
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                       help='Read smaps of N processes in parallel, largest (by HugetlbPages) first')
 
     args = parser.parse_args()
 
+    if sum(map(bool, (args.watch, args.json, args.exporter))) > 1:
+        parser.error("--watch, --json and --exporter are mutually exclusive")
+    if args.exporter and not 1 <= args.exporter <= 65535:
+        parser.error(f"--exporter port must be in range 1-65535: {args.exporter}")
+    if args.cache_ttl < 0:
+        parser.error(f"--cache-ttl must not be negative: {args.cache_ttl}")
+    if args.watch < 0:
+        parser.error(f"--watch interval must be positive: {args.watch}")
+    if args.jobs < 1:
+        parser.error(f"--jobs must be at least 1: {args.jobs}")
+
     # Create and configure analyzer
     analyzer = HugePagesAnalyzer()
     analyzer.debug = args.debug
+    analyzer.watch = args.watch
+    analyzer.json_output = args.json
+    analyzer.exporter_port = args.exporter
+    analyzer.cache_ttl = args.cache_ttl
+    analyzer.jobs = args.jobs
 
     # Run analysis
     analyzer.run()
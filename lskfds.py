@@ -8,38 +8,89 @@ import os
 import sys
 import re
 import glob
+import time
+import fnmatch
+import queue
 import argparse
-import subprocess
+import threading
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from collections import defaultdict
 
+# Paths the kernel gives files of internal in-memory mounts: memfd_create(2), MAP_SHARED|MAP_ANONYMOUS
+# mappings, SysV shared memory and anonymous shared huge pages
+PSEUDO_PATHS = ('/memfd:', '/dev/zero', '/SYSV', '/anon_hugepage')
+
+# Of these, the ones of shared anonymous memory rather than of a named segment
+ANONYMOUS_PATHS = ('/memfd:', '/dev/zero', '/anon_hugepage')
+
+# Mounted filesystems holding files in memory (or none at all), whose space is not disk space
+MEMORY_FILESYSTEMS = {'tmpfs', 'ramfs', 'devtmpfs', 'hugetlbfs', 'proc', 'sysfs', 'devpts', 'mqueue',
+                      'cgroup', 'cgroup2', 'debugfs', 'tracefs', 'securityfs', 'pstore', 'bpf',
+                      'configfs', 'fusectl', 'autofs', 'binfmt_misc', 'nsfs', 'efivarfs', 'rpc_pipefs'}
+
 class KilledFileDescriptorsAnalyzer:
     def __init__(self):
         self.debug = False
         self.show_size = False
         self.sort_by_size = False
         self.min_size_mb = 0
+        self.path_pattern = None
+
+        # Also scan memory mappings of deleted files (shared libraries replaced by an update,
+        # SHM segments), listed with "mem" in place of an FD number
+        self.scan_maps = False
+
+        # Reclaim mode: truncate killed files to free their space, except files mapped
+        # in memory or held by protected processes (PIDs or comm names)
+        self.reclaim = False
+        self.assume_yes = False
+        # Truncate even though some processes were unreadable (never without asking)
+        self.force = False
+        self.protected = {'1', str(os.getpid())}
+
+        # Worker threads scanning PIDs, and time after which a PID is given up as
+        # unreadable (hung NFS or FUSE mounts block readlink/stat of its FDs)
+        self.jobs = 4
+        self.timeout = 5.0
+        self.unreadable_pids = []
+
+        # Inode numbers of deleted files mapped in memory, and (device, inode) keys of killed
+        # files held by unreadable processes, whose mappings are unknown (reclaim mode)
+        self.mapped_inodes = set()
+        self.unreadable_keys = set()
+
+        # Devices of the mounted disk-backed filesystems, read from mountinfo when planning
+        self.disk_devices = None
 
         # Output formatting
         self.header_format = "{:<8} {:<8} {:<22} {:<15} {}"
         self.row_format = "{:<8} {:<8} {:<22} {:<15} {}"
+        self.plan_format = "{:<10} {:<8} {:<26} {:<8} {}"
+
+        # Per-run process info (comm, cmdline), read once per PID
+        self.process_cache = {}
 
     def debug_print(self, message: str):
         """Print debug message prefixed with '#' for shell parseability"""
         if self.debug:
             print(f"# DEBUG: {message}")
 
-    def get_file_size(self, fd_path: str) -> int:
-        """Get file size from file descriptor, return size in bytes"""
+    def get_file_stat(self, fd_path: str) -> Optional[os.stat_result]:
+        """Get the stat of the file behind a file descriptor"""
         try:
-            stat_info = os.stat(fd_path)
-            return stat_info.st_size
+            return os.stat(fd_path)
         except (OSError, IOError):
-            return 0
+            return None
 
     def get_process_info(self, pid: str) -> Tuple[Optional[str], Optional[str]]:
-        """Get process command and full command line"""
+        """Get process command and full command line, cached per PID"""
+        if pid not in self.process_cache:
+            self.process_cache[pid] = self.read_process_info(pid)
+        return self.process_cache[pid]
+
+    def read_process_info(self, pid: str) -> Tuple[Optional[str], Optional[str]]:
+        """Read process command and full command line from /proc"""
         try:
             # Get command name from /proc/<pid>/comm (more reliable than ps)
             with open(f'/proc/{pid}/comm', 'r') as f:
@@ -59,16 +110,7 @@ class KilledFileDescriptorsAnalyzer:
             return comm, cmdline
 
         except (IOError, OSError):
-            # Fallback to ps command
-            try:
-                result = subprocess.run(['ps', '-p', pid, '-o', 'comm='], 
-                                      capture_output=True, text=True, timeout=2)
-                if result.returncode == 0:
-                    comm = result.stdout.strip()
-                    return comm, comm
-            except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-                pass
-
+            # Process exited: ps could not tell more than /proc
             return None, None
 
     def format_size(self, size_bytes: int) -> str:
@@ -82,7 +124,7 @@ class KilledFileDescriptorsAnalyzer:
         else:
             return f"{size_bytes}B"
 
-    def scan_killed_file_descriptors(self) -> List[Tuple[str, str, str, str, str, int]]:
+    def scan_killed_file_descriptors(self) -> List[Dict]:
         """Scan all processes for killed file descriptors"""
         self.debug_print("Starting killed file descriptor scan")
         killed_fds = []
@@ -94,70 +136,216 @@ class KilledFileDescriptorsAnalyzer:
             self.debug_print("Cannot access /proc directory")
             return []
 
-        self.debug_print(f"Scanning {len(proc_dirs)} processes")
+        self.debug_print(f"Scanning {len(proc_dirs)} processes with {self.jobs} workers")
 
-        for pid in proc_dirs:
-            fd_dir = f'/proc/{pid}/fd'
+        killed_fds = self.scan_pids(proc_dirs)
 
-            # Check if fd directory is accessible
-            if not os.path.isdir(fd_dir) or not os.access(fd_dir, os.R_OK):
-                continue
+        self.debug_print(f"Found {len(killed_fds)} killed file descriptors")
+        return killed_fds
+
+    def scan_pids(self, pids: List[str]) -> List[Dict]:
+        """Scan processes with self.jobs worker threads, giving up on PIDs taking over self.timeout seconds"""
+        tasks = queue.Queue()
+        for pid in pids:
+            tasks.put(pid)
+        done = queue.Queue()
+        # PID being scanned and its start time, by worker thread
+        running = {}
+        workers = []
+        # Killed FDs by PID, kept in case reading its maps then blocks
+        pid_fds = {}
+
+        def worker():
+            thread = threading.current_thread()
+            # A worker removed from the list was given up on and must not take more PIDs
+            while thread in workers:
+                try:
+                    pid = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                running[thread] = (pid, time.monotonic())
+                pid_killed_fds = []
+                mapped_inodes = set()
+                try:
+                    pid_killed_fds = pid_fds[pid] = self.scan_pid_killed_fds(pid)
+                    if self.scan_maps or self.reclaim:
+                        deleted_maps, mapped_inodes = self.scan_pid_deleted_maps(pid)
+                        if self.scan_maps:
+                            pid_killed_fds = pid_killed_fds + deleted_maps
+                finally:
+                    running.pop(thread, None)
+                    done.put((pid, pid_killed_fds, mapped_inodes))
+
+        killed_fds = []
+        pending = set(pids)
+        while pending:
+            # Keep self.jobs live workers, replacing the ones stuck on a PID
+            workers[:] = [thread for thread in workers if thread.is_alive()]
+            while len(workers) < self.jobs and not tasks.empty():
+                # Daemon threads: a worker blocked in the kernel must not keep the tool from exiting
+                thread = threading.Thread(target=worker, daemon=True)
+                workers.append(thread)
+                thread.start()
 
             try:
-                # List all file descriptors
-                fd_entries = os.listdir(fd_dir)
+                pid, pid_killed_fds, mapped_inodes = done.get(timeout=0.1)
+                if pid in pending:
+                    pending.discard(pid)
+                    killed_fds.extend(pid_killed_fds)
+                    self.mapped_inodes.update(mapped_inodes)
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for thread, (pid, start_time) in list(running.items()):
+                if now - start_time > self.timeout and pid in pending:
+                    self.debug_print(f"PID {pid} unreadable after {self.timeout}s, giving up")
+                    pending.discard(pid)
+                    self.unreadable_pids.append(pid)
+                    # Its FDs, if read before blocking, are kept: reclaim mode skips their files
+                    killed_fds.extend(pid_fds.get(pid, []))
+                    self.unreadable_keys.update(killed_fd['key'] for killed_fd in pid_fds.get(pid, []))
+                    if thread in workers:
+                        workers.remove(thread)
 
-                for fd_name in fd_entries:
-                    fd_path = os.path.join(fd_dir, fd_name)
+        return killed_fds
 
+    def scan_pid_killed_fds(self, pid: str) -> List[Dict]:
+        """Scan the file descriptors of one process for killed files, in one readlink pass"""
+        killed_fds = []
+        try:
+            # Inaccessible or vanished fd directories fail here, no separate checks needed
+            with os.scandir(f'/proc/{pid}/fd') as fd_entries:
+                for fd_entry in fd_entries:
                     try:
                         # Resolve the symlink
-                        link_target = os.readlink(fd_path)
+                        link_target = os.readlink(fd_entry.path)
+                    except (OSError, IOError):
+                        # File descriptor may have disappeared or be inaccessible
+                        continue
 
-                        # Check if this is a killed file descriptor (deleted file)
-                        if '(deleted)' in link_target:
-                            # Get process information
-                            comm, cmdline = self.get_process_info(pid)
-                            if not comm:
-                                continue
+                    # Check if this is a killed file descriptor (deleted file)
+                    if not link_target.endswith(' (deleted)'):
+                        continue
 
-                            # Get file size if requested
-                            file_size = 0
-                            if self.show_size:
-                                file_size = self.get_file_size(fd_path)
+                    # Get process information
+                    comm, cmdline = self.get_process_info(pid)
+                    if not comm:
+                        continue
 
-                                # Skip files smaller than minimum size
-                                if self.min_size_mb > 0 and file_size < (self.min_size_mb * 1024 * 1024):
-                                    continue
+                    # Clean up the killed file path
+                    clean_path = link_target[:-len(' (deleted)')]
+                    if self.path_pattern and not fnmatch.fnmatch(clean_path, self.path_pattern):
+                        continue
 
-                            # Clean up the killed file path
-                            clean_path = link_target.replace(' (deleted)', '')
+                    # Identify the file by (device, inode), several FDs may hold the same one;
+                    # allocated blocks are what deleting it for good gives back
+                    stat_info = self.get_file_stat(fd_entry.path)
+                    if stat_info is not None:
+                        file_key = (stat_info.st_dev, stat_info.st_ino)
+                        file_size = stat_info.st_blocks * 512
+                    else:
+                        file_key = (None, f"{pid}/{fd_entry.name}")
+                        file_size = 0
+
+                    # Skip files smaller than minimum size
+                    if self.min_size_mb > 0 and file_size < (self.min_size_mb * 1024 * 1024):
+                        continue
+
+                    killed_fds.append({'pid': pid, 'fd': fd_entry.name, 'comm': comm, 'cmdline': cmdline,
+                                       'path': clean_path, 'key': file_key, 'size': file_size})
+                    self.debug_print(f"Found killed FD: PID {pid}, FD {fd_entry.name}, CMD {comm}, FILE {clean_path}")
+        except (OSError, IOError):
+            # Process may have disappeared or fd directory inaccessible
+            pass
+        return killed_fds
 
-                            killed_fds.append((pid, fd_name, comm, cmdline, clean_path, file_size))
-                            self.debug_print(f"Found killed FD: PID {pid}, FD {fd_name}, CMD {comm}, FILE {clean_path}")
+    def scan_pid_deleted_maps(self, pid: str) -> Tuple[List[Dict], set]:
+        """Scan the memory mappings of one process for deleted files, one entry per file,
+        with the inode numbers of all of them (before any filter, for reclaim mode)"""
+        deleted_maps = {}
+        mapped_inodes = set()
+        try:
+            with open(f'/proc/{pid}/maps', 'r') as f:
+                for line in f:
+                    # "7f2c3a000000-7f2c3a021000 r--p 00000000 fd:01 1837524   /usr/lib64/libz.so.1 (deleted)"
+                    fields = line.rstrip('\n').split(None, 5)
+                    if len(fields) < 6 or not fields[5].endswith(' (deleted)'):
+                        continue
+                    # Shared anonymous memory and memfds were never files on any filesystem;
+                    # SysV and /dev/shm segments are kept, they are what --maps is about
+                    if fields[5].startswith(ANONYMOUS_PATHS):
+                        continue
+                    mapped_inodes.add(int(fields[4]))
 
-                    except (OSError, IOError):
-                        # File descriptor may have disappeared or be inaccessible
+                    # Get process information
+                    comm, cmdline = self.get_process_info(pid)
+                    if not comm:
                         continue
 
-            except (OSError, IOError):
-                # Process may have disappeared or fd directory inaccessible
-                continue
+                    # Clean up the killed file path
+                    clean_path = fields[5][:-len(' (deleted)')]
+                    if self.path_pattern and not fnmatch.fnmatch(clean_path, self.path_pattern):
+                        continue
 
-        self.debug_print(f"Found {len(killed_fds)} killed file descriptors")
-        return killed_fds
+                    # map_files (root only) gives the same (device, inode) and allocated
+                    # blocks as an FD stat; maps itself only has the device numbers and inode
+                    # map_files names are unpadded "%lx-%lx", maps pads low addresses ("00400000-00452000")
+                    map_name = '%x-%x' % tuple(int(address, 16) for address in fields[0].split('-'))
+                    stat_info = self.get_file_stat(f'/proc/{pid}/map_files/{map_name}')
+                    if stat_info is not None:
+                        file_key = (stat_info.st_dev, stat_info.st_ino)
+                        file_size = stat_info.st_blocks * 512
+                    else:
+                        major, minor = fields[3].split(':')
+                        file_key = (os.makedev(int(major, 16), int(minor, 16)), int(fields[4]))
+                        file_size = 0
+
+                    # Skip files smaller than minimum size
+                    if self.min_size_mb > 0 and file_size < (self.min_size_mb * 1024 * 1024):
+                        continue
 
-    def display_results(self, killed_fds: List[Tuple[str, str, str, str, str, int]]):
-        """Display the results in a formatted table"""
-        if not killed_fds:
+                    # A file is usually mapped in several segments, keep one entry per process
+                    if file_key not in deleted_maps:
+                        deleted_maps[file_key] = {'pid': pid, 'fd': 'mem', 'comm': comm, 'cmdline': cmdline,
+                                                  'path': clean_path, 'key': file_key, 'size': file_size}
+                        self.debug_print(f"Found deleted mapping: PID {pid}, CMD {comm}, FILE {clean_path}")
+        except (OSError, IOError, ValueError):
+            # Process may have disappeared or maps inaccessible
+            pass
+        return list(deleted_maps.values()), mapped_inodes
+
+    def holder_order(self, holder: Dict) -> Tuple[int, int]:
+        """Sort key of a holder: PID, then FD, mappings ("mem") first"""
+        return int(holder['pid']), int(holder['fd']) if holder['fd'].isdigit() else -1
+
+    def group_killed_files(self, killed_fds: List[Dict]) -> List[Dict]:
+        """Group killed file descriptors by (device, inode), one entry per file with its holders"""
+        killed_files = {}
+        for killed_fd in sorted(killed_fds, key=self.holder_order):
+            killed_file = killed_files.setdefault(killed_fd['key'], {
+                'key': killed_fd['key'],
+                'path': killed_fd['path'],
+                'size': killed_fd['size'],
+                'holders': [],
+            })
+            killed_file['holders'].append(killed_fd)
+
+        self.debug_print(f"Grouped {len(killed_fds)} killed file descriptors into {len(killed_files)} files")
+        return list(killed_files.values())
+
+    def display_results(self, killed_files: List[Dict]):
+        """Display the results in a formatted table, one row per killed file"""
+        if not killed_files:
             print("No killed file descriptors found.")
             return
 
         # Sort results
         if self.sort_by_size and self.show_size:
-            killed_fds.sort(key=lambda x: x[5], reverse=True)  # Sort by size descending
+            killed_files.sort(key=lambda x: x['size'], reverse=True)  # Sort by size descending
         else:
-            killed_fds.sort(key=lambda x: (int(x[0]), int(x[1])))  # Sort by PID, then FD
+            # Sort by first holder PID, then FD
+            killed_files.sort(key=lambda x: self.holder_order(x['holders'][0]))
 
         # Print header
         if self.show_size:
@@ -167,22 +355,155 @@ class KilledFileDescriptorsAnalyzer:
             print("{:<8} {:<8} {:<22} {}".format("PID", "FD", "CMD", "KILLED FILE"))
             print("-" * 60)
 
-        # Print results
+        # Print results, the first holder with the file and the others below it
         total_size = 0
-        for pid, fd, comm, cmdline, killed_path, file_size in killed_fds:
+        total_fds = 0
+        for killed_file in killed_files:
+            first, others = killed_file['holders'][0], killed_file['holders'][1:]
             if self.show_size:
-                size_str = self.format_size(file_size)
-                print(self.row_format.format(pid, fd, comm, size_str, killed_path))
-                total_size += file_size
+                size_str = self.format_size(killed_file['size'])
+                print(self.row_format.format(first['pid'], first['fd'], first['comm'], size_str, killed_file['path']))
+                total_size += killed_file['size']
             else:
-                print("{:<8} {:<8} {:<22} {}".format(pid, fd, comm, killed_path))
+                print("{:<8} {:<8} {:<22} {}".format(first['pid'], first['fd'], first['comm'], killed_file['path']))
+            if others:
+                holders = ' '.join(f"{holder['pid']}/{holder['fd']}" for holder in others)
+                print(f"{'':<8} + {len(others)} more holders (PID/FD): {holders}")
+            total_fds += len(killed_file['holders'])
 
         # Show summary
         print("-" * (80 if self.show_size else 60))
+        holder_kind = "file descriptors and mappings" if self.scan_maps else "file descriptors"
         if self.show_size:
-            print(f"Total: {len(killed_fds)} killed files, {self.format_size(total_size)} wasted space")
+            print(f"Total: {len(killed_files)} killed files held by {total_fds} {holder_kind}, "
+                  f"{self.format_size(total_size)} wasted space (allocated)")
         else:
-            print(f"Total: {len(killed_fds)} killed file descriptors found")
+            print(f"Total: {len(killed_files)} killed files held by {total_fds} {holder_kind}")
+
+        if self.scan_maps:
+            # Mapped deleted files are only released when their processes restart
+            restart = {holder['pid']: holder['comm'] for killed_file in killed_files
+                       for holder in killed_file['holders'] if holder['fd'] == 'mem'}
+            if restart:
+                print(f"To restart: {len(restart)} processes mapping deleted files: "
+                      + ', '.join(f"{pid} ({comm})" for pid, comm in sorted(restart.items(), key=lambda x: int(x[0]))))
+
+    def get_disk_devices(self) -> set:
+        """Get the devices of the mounted filesystems backed by storage, from /proc/self/mountinfo"""
+        if self.disk_devices is None:
+            self.disk_devices = set()
+            try:
+                with open('/proc/self/mountinfo', 'r') as f:
+                    for line in f:
+                        # "36 25 8:2 / /var rw,relatime shared:1 - xfs /dev/sda2 rw,attr2"
+                        fields = line.split()
+                        try:
+                            separator = fields.index('-')
+                        except ValueError:
+                            continue
+                        fstype = fields[separator + 1] if len(fields) > separator + 1 else ''
+                        if fstype in MEMORY_FILESYSTEMS:
+                            continue
+                        major, minor = fields[2].split(':')
+                        self.disk_devices.add(os.makedev(int(major), int(minor)))
+            except (OSError, IOError, ValueError, IndexError):
+                self.debug_print("Cannot read /proc/self/mountinfo")
+        return self.disk_devices
+
+    def is_on_disk(self, killed_file: Dict) -> bool:
+        """Tell whether a killed file uses disk space: memfd, shared anonymous and SysV memory
+        live on internal, unmounted in-memory filesystems, and truncating them frees no disk"""
+        if killed_file['path'].startswith(PSEUDO_PATHS):
+            return False
+        # btrfs subvolumes have their own st_dev, not listed in mountinfo: their files are
+        # skipped, which is the safe way to be wrong
+        return killed_file['key'][0] in self.get_disk_devices()
+
+    def plan_reclaim(self, killed_files: List[Dict]) -> List[Tuple[Dict, Optional[str]]]:
+        """Decide which killed files to truncate, with the reason to skip the others"""
+        # Mapped inodes come from the maps read by the scan workers. Inode numbers alone
+        # are compared: maps devices don't always match st_dev (btrfs subvolumes), and a
+        # false match only skips a file
+        plan = []
+        for killed_file in sorted(killed_files, key=lambda x: x['size'], reverse=True):
+            dev, inode = killed_file['key']
+            protected = [holder for holder in killed_file['holders']
+                         if holder['pid'] in self.protected or holder['comm'] in self.protected]
+            if dev is None:
+                reason = "not stat-able"
+            elif not self.is_on_disk(killed_file):
+                reason = "not on disk"
+            elif killed_file['key'] in self.unreadable_keys:
+                reason = "holder unreadable"
+            elif inode in self.mapped_inodes:
+                reason = "mapped in memory"
+            elif protected:
+                reason = f"protected PID {protected[0]['pid']}"
+            elif killed_file['size'] == 0:
+                reason = "no space allocated"
+            else:
+                reason = None
+            plan.append((killed_file, reason))
+        return plan
+
+    def display_reclaim_plan(self, plan: List[Tuple[Dict, Optional[str]]]) -> int:
+        """Display the reclaim plan, returning the bytes truncating would give back"""
+        print(self.plan_format.format("INODE", "HOLDERS", "ACTION", "SIZE", "KILLED FILE"))
+        print("-" * 80)
+        reclaimable = 0
+        for killed_file, reason in plan:
+            action = f"skip: {reason}" if reason else "truncate"
+            print(self.plan_format.format(killed_file['key'][1], len(killed_file['holders']), action,
+                                          self.format_size(killed_file['size']), killed_file['path']))
+            if not reason:
+                reclaimable += killed_file['size']
+        print("-" * 80)
+        files = sum(1 for _, reason in plan if not reason)
+        print(f"Plan: truncate {files} of {len(plan)} killed files, {self.format_size(reclaimable)} "
+              f"({reclaimable} bytes) reclaimable")
+        return reclaimable
+
+    def confirm(self, question: str, allow_assume_yes: bool = True) -> bool:
+        """Ask a yes/no question on the terminal, no without one unless assume_yes is set and allowed"""
+        if self.assume_yes and allow_assume_yes:
+            return True
+        try:
+            return input(f"{question} [y/N] ").strip().lower() in ('y', 'yes')
+        except EOFError:
+            print()
+            return False
+
+    def reclaim_files(self, plan: List[Tuple[Dict, Optional[str]]]):
+        """Truncate each planned killed file once, through the FD of one of its holders"""
+        reclaimed = 0
+        for killed_file, reason in plan:
+            if reason:
+                continue
+            for holder in killed_file['holders']:
+                fd_path = f"/proc/{holder['pid']}/fd/{holder['fd']}"
+                # The FD may have been closed and reused since the scan
+                stat_info = self.get_file_stat(fd_path)
+                if stat_info is None or (stat_info.st_dev, stat_info.st_ino) != killed_file['key']:
+                    continue
+                try:
+                    os.truncate(fd_path, 0)
+                except (OSError, IOError) as e:
+                    print(f"Cannot truncate {killed_file['path']} via {fd_path}: {e}", file=sys.stderr)
+                    continue
+                reclaimed += stat_info.st_blocks * 512
+                print(f"Truncated {killed_file['path']} via {fd_path} ({self.format_size(stat_info.st_blocks * 512)})")
+                break
+            else:
+                print(f"Skipped {killed_file['path']}: no holder left with it open", file=sys.stderr)
+        print(f"Total: {self.format_size(reclaimed)} reclaimed")
+
+    def display_unreadable(self):
+        """Display the processes given up on as unreadable, if any"""
+        if self.unreadable_pids:
+            # Only comm already read is shown: reading cmdline can block on the same hung mount
+            unreadable = ', '.join(f"{pid} ({self.process_cache.get(pid, (None,))[0] or '?'})"
+                                   for pid in sorted(self.unreadable_pids, key=int))
+            print(f"Unreadable: {len(self.unreadable_pids)} processes timed out after {self.timeout}s: {unreadable}")
 
     def run(self):
         """Main execution function"""
@@ -191,8 +512,23 @@ class KilledFileDescriptorsAnalyzer:
         # Scan for killed file descriptors
         killed_fds = self.scan_killed_file_descriptors()
 
-        # Display results
-        self.display_results(killed_fds)
+        # Display results, once per file
+        killed_files = self.group_killed_files(killed_fds)
+        if self.reclaim:
+            plan = self.plan_reclaim(killed_files)
+            reclaimable = self.display_reclaim_plan(plan)
+            # Shown before confirming: files these processes map without an FD can't be told apart
+            self.display_unreadable()
+            # Unreadable processes may map these files or hold them: truncating needs --force,
+            # and is always confirmed on the terminal then
+            if reclaimable and self.unreadable_pids and not self.force:
+                print("Not truncating: some processes were unreadable (use --force)", file=sys.stderr)
+            elif reclaimable and self.confirm("Truncate the files marked truncate?",
+                                              allow_assume_yes=not self.unreadable_pids):
+                self.reclaim_files(plan)
+        else:
+            self.display_results(killed_files)
+            self.display_unreadable()
 
         self.debug_print("Killed file descriptor analysis completed")
 
@@ -206,6 +542,10 @@ Examples:
   %(prog)s --size             # Show with file sizes
   %(prog)s --size --sort      # Show with sizes, sorted by size
   %(prog)s --min-size 10      # Only show files >= 10MB
+  %(prog)s --timeout 2        # Give up on processes blocked over 2s (hung NFS)
+  %(prog)s --maps             # Also show mapped deleted files (e.g. updated libraries)
+  %(prog)s --reclaim --min-size 1024 --path '/var/log/*'
+                              # Truncate deleted logs >= 1GB still held open, after confirmation
   %(prog)s --debug            # Show debug information
 
 Note: This tool helps identify processes holding onto killed (deleted) files,
@@ -214,7 +554,7 @@ which can prevent disk space from being freed until the process is restarted.
     )
 
     parser.add_argument('--size', '-s', action='store_true',
-                       help='Show file sizes and calculate wasted disk space')
+                       help='Show file sizes (allocated blocks) and calculate wasted disk space, counting each file once')
 
     parser.add_argument('--sort', action='store_true',
                        help='Sort by file size (requires --size)')
@@ -222,6 +562,36 @@ which can prevent disk space from being freed until the process is restarted.
     parser.add_argument('--min-size', type=int, default=0, metavar='MB',
                        help='Only show files larger than specified MB (requires --size)')
 
+    parser.add_argument('--path', metavar='PATTERN',
+                       help="Only show killed files whose path matches the shell PATTERN, e.g. '/var/log/*'")
+
+    parser.add_argument('--maps', '-m', action='store_true',
+                       help='Also scan memory mappings for deleted files (FD shown as "mem"), '
+                            'and list the processes to restart to release them')
+
+    parser.add_argument('--reclaim', action='store_true',
+                       help='Show a plan and, after confirmation, truncate each matching killed file once '
+                            'through /proc/PID/fd, skipping memory mapped files, files not on disk (memfd, tmpfs) '
+                            'and protected processes')
+
+    parser.add_argument('--protect', action='append', default=[], metavar='PID|COMM',
+                       help='With --reclaim, never truncate files held by this PID or command name '
+                            '(repeatable, PID 1 is always protected)')
+
+    parser.add_argument('--yes', '-y', action='store_true',
+                       help='With --reclaim, do not ask for confirmation')
+
+    parser.add_argument('--force', action='store_true',
+                       help='With --reclaim, truncate even though some processes were unreadable, '
+                            'always after confirmation (--yes does not apply then)')
+
+    parser.add_argument('--jobs', '-j', type=int, default=4, metavar='N',
+                       help='Scan N processes in parallel (default: 4)')
+
+    parser.add_argument('--timeout', type=float, default=5.0, metavar='SECONDS',
+                       help='Report a process as unreadable when its scan takes over SECONDS, '
+                            'e.g. blocked on a hung NFS or FUSE mount (default: 5)')
+
     parser.add_argument('--debug', action='store_true',
                        help='Enable debug output showing analysis details (prefixed with #)')
 
@@ -233,8 +603,22 @@ which can prevent disk space from being freed until the process is restarted.
     analyzer.show_size = args.size or args.min_size > 0
     analyzer.sort_by_size = args.sort
     analyzer.min_size_mb = args.min_size
+    analyzer.path_pattern = args.path
+    analyzer.scan_maps = args.maps
+    analyzer.reclaim = args.reclaim
+    analyzer.protected.update(args.protect)
+    analyzer.assume_yes = args.yes
+    analyzer.force = args.force
+    analyzer.jobs = args.jobs
+    analyzer.timeout = args.timeout
 
     # Validate arguments
+    if args.jobs < 1 or args.timeout <= 0:
+        parser.error("--jobs must be at least 1 and --timeout positive")
+
+    if (args.protect or args.yes or args.force) and not args.reclaim:
+        parser.error("--protect, --yes and --force require --reclaim")
+
     if args.sort and not analyzer.show_size:
         print("Warning: --sort requires --size, enabling size display", file=sys.stderr)
         analyzer.show_size = True
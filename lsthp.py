@@ -7,8 +7,11 @@
 import os
 import sys
 import re
-import glob
+import time
+import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from collections import defaultdict
@@ -16,12 +19,55 @@ from collections import defaultdict
 class TransparentHugePagesAnalyzer:
     def __init__(self):
         self.debug = False
+        self.efficiency = False
+        self.numa = False
+        self.watch = 0
+        self.json_output = False
+        self.exporter_port = 0
+        self.cache_ttl = 30
+        self.system_only = False
+        self.jobs = 1
+        self.system_pattern = "%-28s : %12s %s"
         self.print_pattern = "%-24s %-10s : %s %s"
+        self.efficiency_pattern = "%-32s %-10s : %10s %10s %8s %9s %s"
         self.index = 0
 
+        # Per-VMA THP statistics of KVM processes, by PID (efficiency mode)
+        self.vma_stats = {}
+
+        # Per-PID state kept across samples (watch mode)
+        self.pid_statm = {}
+        self.prev_totals = {}
+        self.system_counters = {}
+        self.counters_time = 0.0
+
+        # Collapses of fully resident ranges and THP splits leave statm unchanged, so
+        # every PID is rescanned when any of these counters moved since the last sample
+        self.layout_counters = ('thp_collapse_alloc', 'khugepaged_pages_collapsed')
+        self.layout_counter_prefix = 'thp_split_'
+        self.rescan_all = False
+
+        # System THP event counters shown with their rates (system summary)
+        self.summary_counters = ('thp_fault_alloc', 'thp_fault_fallback', 'thp_collapse_alloc',
+                                 'thp_split_page', 'khugepaged_pages_collapsed')
+
+        # Last metrics served, reused by scrapes within cache_ttl (exporter mode)
+        self.metrics_text = None
+        self.metrics_time = 0.0
+
         # KVM process names that should show guest names
         self.kvm_processes = ['qemu-kvm', 'qemu-system-x86_64', 'qemu-system-x86']
 
+        # Per-run process metadata, from one read of /proc/PID/status each
+        self.status_fields = ('Name', 'PPid')
+        self.process_cache = {}
+
+        # Base page size, for numa_maps page counts
+        self.base_page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+
+        # smaps_rollup (Linux 4.14+) gives per-process totals without per-VMA output
+        self.have_smaps_rollup = os.path.exists('/proc/self/smaps_rollup')
+
         # Hugepage size detection
         self.hugepage_size_kb = self.get_hugepage_size()
         self.hugepage_size_display = self.format_hugepage_size(self.hugepage_size_kb)
@@ -87,96 +133,210 @@ class TransparentHugePagesAnalyzer:
                 print(f"Please run {sys.argv[0]} as root!")
                 sys.exit(127)
 
-    def find_transparent_hugepage_processes(self) -> List[str]:
-        """Find processes using transparent hugepages"""
-        self.debug_print("Searching for processes using transparent hugepages")
+    def read_thp_kb(self, pid: str) -> int:
+        """Sum AnonHugePages for a PID in one streaming pass over its smaps"""
+        smaps_name = 'smaps_rollup' if self.have_smaps_rollup else 'smaps'
+        total_kb = 0
+        with open(f'/proc/{pid}/{smaps_name}', 'r') as f:
+            for line in f:
+                # "AnonHugePages:      2048 kB"
+                if line.startswith('AnonHugePages:'):
+                    total_kb += int(line.split()[1])
+        return total_kb
+
+    def read_thp_vma_stats(self, pid: str) -> Dict[str, int]:
+        """Collect per-VMA THP statistics for a PID in one streaming pass over its full smaps"""
+        stats = {'anon_kb': 0, 'thp_kb': 0, 'large_vmas': 0, 'partial_vmas': 0}
+        vma = None
+
+        def account_vma(vma):
+            stats['anon_kb'] += vma['anon']
+            stats['thp_kb'] += vma['thp']
+            # Only anonymous mappings that can hold at least one THP count as large
+            if vma['size'] >= self.hugepage_size_kb and vma['anon'] > 0:
+                stats['large_vmas'] += 1
+                if 0 < vma['thp'] < vma['anon']:
+                    stats['partial_vmas'] += 1
+
+        with open(f'/proc/{pid}/smaps', 'r') as f:
+            for line in f:
+                # "Size:" is the first field of each VMA after its header line
+                if line.startswith('Size:'):
+                    if vma is not None:
+                        account_vma(vma)
+                    vma = {'size': int(line.split()[1]), 'anon': 0, 'thp': 0}
+                elif line.startswith('Anonymous:'):
+                    vma['anon'] = int(line.split()[1])
+                elif line.startswith('AnonHugePages:'):
+                    vma['thp'] = int(line.split()[1])
+        if vma is not None:
+            account_vma(vma)
+        return stats
+
+    def read_numa_anon_kb(self, pid: str) -> Dict[int, int]:
+        """Sum resident anonymous memory per NUMA node from /proc/PID/numa_maps"""
+        node_totals = defaultdict(int)
+        with open(f'/proc/{pid}/numa_maps', 'r') as f:
+            for line in f:
+                # "7f1e00000000 default anon=524288 dirty=524288 N0=262144 N1=262144 kernelpagesize_kB=4"
+                fields = line.split()
+                if not any(field.startswith('anon=') for field in fields):
+                    continue
+                page_kb = self.base_page_kb
+                node_pages = []
+                for field in fields[2:]:
+                    if field.startswith('kernelpagesize_kB='):
+                        page_kb = int(field[18:])
+                    elif field[0] == 'N' and '=' in field:
+                        node, pages = field[1:].split('=', 1)
+                        if node.isdigit():
+                            node_pages.append((int(node), int(pages)))
+                for node, pages in node_pages:
+                    node_totals[node] += pages * page_kb
+        return dict(node_totals)
+
+    def read_statm(self, pid: str) -> str:
+        """Read /proc/PID/statm, a cheap counter snapshot to detect changed processes"""
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return f.read()
+
+    def read_meminfo_thp(self) -> Dict[str, int]:
+        """Read system-wide huge page usage in kB from /proc/meminfo"""
+        meminfo = {}
+        try:
+            with open('/proc/meminfo', 'r') as f:
+                for line in f:
+                    # "AnonHugePages:    436224 kB"
+                    key, _, value = line.partition(':')
+                    if key in ('AnonHugePages', 'ShmemHugePages', 'FileHugePages'):
+                        meminfo[key] = int(value.split()[0])
+        except (IOError, OSError, ValueError):
+            pass
+        return meminfo
 
+    def read_system_counters(self) -> Dict[str, int]:
+        """Read system-wide THP counters from /proc/vmstat and khugepaged"""
+        counters = {}
         try:
-            # Find all smaps files
-            smaps_files = glob.glob('/proc/*/smaps')
-            thp_processes = []
+            with open('/proc/vmstat', 'r') as f:
+                for line in f:
+                    key, value = line.split()
+                    if key.startswith('thp_'):
+                        counters[key] = int(value)
+        except (IOError, OSError, ValueError):
+            pass
 
-            for smaps_file in smaps_files:
+        for name in ('pages_collapsed', 'full_scans'):
+            try:
+                with open(f'/sys/kernel/mm/transparent_hugepage/khugepaged/{name}', 'r') as f:
+                    counters[f'khugepaged_{name}'] = int(f.read())
+            except (IOError, OSError, ValueError):
+                pass
+        return counters
+
+    def read_pid_thp_kb(self, pid: str) -> Optional[int]:
+        """Total THP in kB for a PID, None if it disappeared or is inaccessible"""
+        try:
+            if self.efficiency and self.get_process_name(pid) in self.kvm_processes:
+                # Same single pass, over the full smaps to get per-VMA detail
+                self.vma_stats[pid] = self.read_thp_vma_stats(pid)
+                return self.vma_stats[pid]['thp_kb']
+            return self.read_thp_kb(pid)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def scan_thp_processes(self) -> Dict[str, int]:
+        """Find processes using transparent hugepages, with their total in kB by PID"""
+        self.debug_print(f"Scanning processes for transparent hugepages "
+                         f"(using {'smaps_rollup' if self.have_smaps_rollup else 'smaps'}, {self.jobs} jobs)")
+        pid_totals = {}
+        seen_pids = {}
+        pid_rss = {}
+
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            if self.watch or self.jobs > 1:
                 try:
-                    with open(smaps_file, 'r') as f:
-                        content = f.read()
-                        # Look for AnonHugePages entries that are not "0 kB"
-                        if 'AnonHugePages:' in content:
-                            lines = content.split('\n')
-                            for line in lines:
-                                if 'AnonHugePages:' in line and not line.endswith(' 0 kB'):
-                                    thp_processes.append(smaps_file)
-                                    break
+                    statm = self.read_statm(pid)
                 except (IOError, OSError):
                     # Process may have disappeared or be inaccessible
                     continue
+                if self.watch:
+                    seen_pids[pid] = statm
+                    # Only rescan smaps of processes whose statm changed since the last sample
+                    if not self.rescan_all and self.pid_statm.get(pid) == statm:
+                        if pid in self.prev_totals:
+                            pid_totals[pid] = self.prev_totals[pid]
+                        continue
+                # "size resident shared text lib data dt", in pages
+                pid_rss[pid] = int(statm.split()[1])
+            else:
+                pid_rss[pid] = 0
+
+        pids = list(pid_rss)
+        if self.jobs > 1:
+            # Largest processes first, so their slow smaps reads don't end up last on one worker;
+            # each worker streams its file down to a single total, keeping memory flat
+            pids.sort(key=pid_rss.get, reverse=True)
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                totals = list(executor.map(self.read_pid_thp_kb, pids))
+        else:
+            totals = map(self.read_pid_thp_kb, pids)
 
-            self.debug_print(f"Found {len(thp_processes)} processes using transparent hugepages")
-            return thp_processes
+        for pid, total_kb in zip(pids, totals):
+            # None if the process disappeared or is inaccessible
+            if total_kb:
+                pid_totals[pid] = total_kb
+                self.debug_print(f"PID {pid}: {total_kb} kB total THP")
 
-        except Exception as e:
-            self.debug_print(f"Error finding transparent hugepage processes: {e}")
-            return []
+        if self.watch:
+            # Forget exited processes, so a reused PID is always rescanned
+            self.pid_statm = seen_pids
+            self.prev_totals = pid_totals
 
-    def extract_thp_info(self, smaps_files: List[str]) -> Dict[str, int]:
-        """Extract transparent hugepage information from smaps files, grouped by PID"""
-        pid_totals = defaultdict(int)
+        self.debug_print(f"Found {len(pid_totals)} processes using transparent hugepages")
+        return pid_totals
 
-        for smaps_file in smaps_files:
+    def get_process_info(self, pid: str) -> Optional[Dict[str, str]]:
+        """Get status fields for a PID from a single read of /proc/PID/status, cached per run"""
+        if pid not in self.process_cache:
+            info = None
             try:
-                with open(smaps_file, 'r') as f:
-                    content = f.read()
-
-                # Extract PID from path: /proc/1234/smaps -> 1234
-                pid_match = re.search(r'/proc/(\d+)/smaps', smaps_file)
-                if not pid_match:
-                    continue
-                pid = pid_match.group(1)
-
-                # Sum all AnonHugePages for this PID
-                total_kb = 0
-                for line in content.split('\n'):
-                    if 'AnonHugePages:' in line and not line.endswith(' 0 kB'):
-                        # Extract size from "AnonHugePages:    2048 kB"
-                        anon_match = re.search(r'AnonHugePages:\s+(\d+)\s+kB', line)
-                        if anon_match:
-                            size_kb = int(anon_match.group(1))
-                            if size_kb > 0:
-                                total_kb += size_kb
-
-                if total_kb > 0:
-                    pid_totals[pid] = total_kb
-                    self.debug_print(f"PID {pid}: {total_kb} kB total THP")
-
+                with open(f'/proc/{pid}/status', 'r') as f:
+                    info = {}
+                    for line in f:
+                        key, _, value = line.partition(':')
+                        if key in self.status_fields:
+                            info[key] = value.strip()
+                            if len(info) == len(self.status_fields):
+                                break
             except (IOError, OSError):
-                continue
-
-        self.debug_print(f"Found {len(pid_totals)} processes using transparent hugepages")
-        return dict(pid_totals)
+                # Process may have disappeared or be inaccessible
+                info = None
+            self.process_cache[pid] = info
+        return self.process_cache[pid]
 
     def get_process_name(self, pid: str) -> Optional[str]:
         """Get process name from /proc/PID/status"""
-        try:
-            with open(f'/proc/{pid}/status', 'r') as f:
-                for line in f:
-                    if line.startswith('Name:'):
-                        return line.split()[1]
-        except (IOError, OSError):
-            pass
-        return None
+        info = self.get_process_info(pid)
+        return info.get('Name') if info else None
 
     def get_ppid(self, pid: str) -> Optional[str]:
         """Get parent PID from /proc/PID/status"""
-        try:
-            with open(f'/proc/{pid}/status', 'r') as f:
-                for line in f:
-                    if line.startswith('PPid:'):
-                        return line.split()[1]
-        except (IOError, OSError):
-            pass
-        return None
+        info = self.get_process_info(pid)
+        return info.get('PPid') if info else None
 
     def get_guest_name(self, pid: str) -> str:
+        """Get guest name of a KVM process, read from its cmdline on first use"""
+        info = self.get_process_info(pid)
+        if info is None:
+            return ""
+        if 'Guest' not in info:
+            info['Guest'] = self.read_guest_name(pid)
+        return info['Guest']
+
+    def read_guest_name(self, pid: str) -> str:
         """Extract guest name from KVM process cmdline"""
         try:
             with open(f'/proc/{pid}/cmdline', 'rb') as f:
@@ -215,6 +375,11 @@ class TransparentHugePagesAnalyzer:
 
         return display_name, f"({pid})", formatted_size
 
+    def format_delta(self, delta_kb: int) -> str:
+        """Format a signed size change for display"""
+        sign = '+' if delta_kb >= 0 else '-'
+        return f"{sign}{self.format_size_display(abs(delta_kb))}"
+
     def format_size_display(self, size_kb: int) -> str:
         """Format size for consistent display"""
         if size_kb >= 1024 * 1024:  # >= 1GB
@@ -226,46 +391,47 @@ class TransparentHugePagesAnalyzer:
         else:
             return f"{size_kb} kB"
 
-    def run(self):
-        """Main execution function"""
-        self.check_root_privileges()
-
-        self.debug_print(f"Starting transparent hugepage analysis (THP size: {self.hugepage_size_display})")
-
-        # Find processes using transparent hugepages
-        smaps_files = self.find_transparent_hugepage_processes()
-
-        if not smaps_files:
-            print("No Transparent HugePages found!")
+    def display_efficiency(self):
+        """Display THP coverage of the anonymous memory of each KVM process"""
+        if not self.vma_stats:
+            print("No KVM processes found!")
             return
 
-        # Extract transparent hugepage information (grouped by PID)
-        pid_totals = self.extract_thp_info(smaps_files)
+        print(self.efficiency_pattern % (f"# [procname] ({self.hugepage_size_display} THP efficiency)", "PID",
+                                         "Anon RSS", "THP", "Coverage", "Partial", "NUMA (anon)"))
 
-        if not pid_totals:
-            print("No Transparent HugePages found!")
-            return
-
-        # Print header with hugepage size information
-        print(self.print_pattern % (f"# [procname] ({self.hugepage_size_display} Transparent HugePages)", "PID", "Total THP", "Usage"))
+        for pid, stats in sorted(self.vma_stats.items(), key=lambda x: x[1]['anon_kb'], reverse=True):
+            display_name, pid_display, _ = self.format_process_info(
+                pid, self.get_process_name(pid), stats['thp_kb'])
+            coverage = 100.0 * stats['thp_kb'] / stats['anon_kb'] if stats['anon_kb'] else 0.0
 
-        # Group by parent process for cleaner output.
-        # THP is per-process (private anonymous memory), so we sum all
-        # members' usage within each group rather than counting only once.
+            numa_display = ""
+            if self.numa:
+                try:
+                    node_totals = self.read_numa_anon_kb(pid)
+                    numa_display = " ".join(f"N{node}={self.format_size_display(kb)}"
+                                            for node, kb in sorted(node_totals.items()))
+                except (IOError, OSError, ValueError):
+                    numa_display = "?"
+
+            print(self.efficiency_pattern % (
+                display_name, pid_display,
+                self.format_size_display(stats['anon_kb']), self.format_size_display(stats['thp_kb']),
+                f"{coverage:.1f}%", f"{stats['partial_vmas']}/{stats['large_vmas']}", numa_display))
+
+    def group_processes(self, pid_totals: Dict[str, int]) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+        """Group PIDs under their parent when it is also listed, returning groups and names by PID"""
         pid_set = set(pid_totals.keys())
         pid_ppid = {}
         pid_name = {}
 
         for pid in list(pid_set):
-            if not os.path.exists(f'/proc/{pid}/status'):
+            info = self.get_process_info(pid)
+            if info is None or 'Name' not in info:
                 pid_set.discard(pid)
                 continue
-            pid_ppid[pid] = self.get_ppid(pid)
-            name = self.get_process_name(pid)
-            if name is None:
-                pid_set.discard(pid)
-                continue
-            pid_name[pid] = name
+            pid_ppid[pid] = info.get('PPid')
+            pid_name[pid] = info['Name']
 
         groups = {}
         for pid in pid_set:
@@ -278,6 +444,170 @@ class TransparentHugePagesAnalyzer:
                 if pid not in groups:
                     groups[pid] = {'children': []}
 
+        return groups, pid_name
+
+    def collect_results(self, pid_totals: Dict[str, int]) -> Dict:
+        """Build per-PID, per-group and total THP usage in kB, with guest names"""
+        groups, pid_name = self.group_processes(pid_totals)
+
+        def guest_of(pid: str) -> str:
+            return self.get_guest_name(pid) if pid_name[pid] in self.kvm_processes else ""
+
+        processes = []
+        for pid in sorted(pid_name, key=int):
+            ppid = self.get_ppid(pid)
+            processes.append({
+                'pid': int(pid),
+                'ppid': int(ppid) if ppid else None,
+                'name': pid_name[pid],
+                'guest': guest_of(pid),
+                'thp_kb': pid_totals[pid],
+            })
+
+        group_list = []
+        for leader_pid in sorted(groups, key=int):
+            children = sorted(groups[leader_pid]['children'], key=int)
+            group_list.append({
+                'leader_pid': int(leader_pid),
+                'name': pid_name[leader_pid],
+                'guest': guest_of(leader_pid),
+                'children': [int(pid) for pid in children],
+                'thp_kb': pid_totals[leader_pid] + sum(pid_totals[pid] for pid in children),
+            })
+
+        total_kb = sum(group['thp_kb'] for group in group_list)
+        system_kb = self.read_meminfo_thp().get('AnonHugePages')
+        return {
+            'thp_size_kb': self.hugepage_size_kb,
+            'processes': processes,
+            'groups': group_list,
+            'total_kb': total_kb,
+            'system_kb': system_kb,
+            'gap_kb': system_kb - total_kb if system_kb is not None else None,
+            'counters': self.read_system_counters(),
+        }
+
+    def format_labels(self, **labels) -> str:
+        """Format Prometheus labels, escaping backslashes, quotes and newlines in values"""
+        escaped = []
+        for key, value in labels.items():
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+
+    def format_prometheus(self, results: Dict) -> str:
+        """Format collected results as Prometheus text exposition, sizes in bytes"""
+        lines = [
+            '# HELP lsthp_process_thp_bytes Transparent hugepages (AnonHugePages) used by a process.',
+            '# TYPE lsthp_process_thp_bytes gauge',
+        ]
+        for proc in results['processes']:
+            lines.append(f"lsthp_process_thp_bytes{self.format_labels(pid=proc['pid'], name=proc['name'], guest=proc['guest'])} "
+                         f"{proc['thp_kb'] * 1024}")
+        lines += [
+            '# HELP lsthp_group_thp_bytes Transparent hugepages used by a process and its listed children.',
+            '# TYPE lsthp_group_thp_bytes gauge',
+        ]
+        for group in results['groups']:
+            lines.append(f"lsthp_group_thp_bytes{self.format_labels(leader_pid=group['leader_pid'], name=group['name'], guest=group['guest'], children=len(group['children']))} "
+                         f"{group['thp_kb'] * 1024}")
+        lines += [
+            '# HELP lsthp_thp_bytes Transparent hugepages used by all processes.',
+            '# TYPE lsthp_thp_bytes gauge',
+            f"lsthp_thp_bytes{self.format_labels(thp_size=self.hugepage_size_display)} {results['total_kb'] * 1024}",
+        ]
+        if results['system_kb'] is not None:
+            lines += [
+                '# HELP lsthp_system_thp_bytes AnonHugePages from /proc/meminfo.',
+                '# TYPE lsthp_system_thp_bytes gauge',
+                f"lsthp_system_thp_bytes {results['system_kb'] * 1024}",
+            ]
+        lines += [
+            '# HELP lsthp_events_total THP events from /proc/vmstat and khugepaged.',
+            '# TYPE lsthp_events_total counter',
+        ]
+        for key, value in sorted(results['counters'].items()):
+            lines.append(f"lsthp_events_total{self.format_labels(event=key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def get_prometheus_metrics(self) -> str:
+        """Get metrics text, rescanning only when the cached one is older than cache_ttl"""
+        now = time.monotonic()
+        if self.metrics_text is None or now - self.metrics_time >= self.cache_ttl:
+            self.process_cache = {}
+            self.metrics_text = self.format_prometheus(self.collect_results(self.scan_thp_processes()))
+            self.metrics_time = now
+        else:
+            self.debug_print(f"Serving cached metrics ({now - self.metrics_time:.1f}s old)")
+        return self.metrics_text
+
+    def serve_metrics(self):
+        """Serve metrics over HTTP on localhost until interrupted"""
+        MetricsHandler.analyzer = self
+        server = HTTPServer(('127.0.0.1', self.exporter_port), MetricsHandler)
+        print(f"Serving metrics on http://127.0.0.1:{self.exporter_port}/metrics (cache {self.cache_ttl}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def run(self):
+        """Main execution function"""
+        self.check_root_privileges()
+
+        if self.exporter_port:
+            self.serve_metrics()
+            return
+
+        if self.system_only:
+            self.watch_system()
+            return
+
+        self.debug_print(f"Starting transparent hugepage analysis (THP size: {self.hugepage_size_display})")
+
+        # Find processes using transparent hugepages (grouped by PID)
+        pid_totals = self.scan_thp_processes()
+        self.system_counters = self.read_system_counters()
+        self.counters_time = time.monotonic()
+
+        if self.efficiency:
+            self.display_efficiency()
+            return
+
+        if self.json_output:
+            print(json.dumps(self.collect_results(pid_totals), indent=2))
+            return
+
+        self.display_results(pid_totals)
+
+        if self.watch:
+            self.watch_changes(pid_totals)
+
+    def display_reconciliation(self, total_kb: int):
+        """Display the gap between the per-process THP total and AnonHugePages from /proc/meminfo"""
+        system_kb = self.read_meminfo_thp().get('AnonHugePages')
+        if system_kb is None:
+            return
+        print(self.print_pattern % ("SYSTEM (/proc/meminfo)", "", self.format_size_display(system_kb),
+                                    f"gap {self.format_delta(system_kb - total_kb)}"))
+
+    def display_results(self, pid_totals: Dict[str, int]):
+        """Display transparent hugepage usage grouped by parent process"""
+        if not pid_totals:
+            print("No Transparent HugePages found!")
+            self.display_reconciliation(0)
+            return
+
+        # Print header with hugepage size information
+        print(self.print_pattern % (f"# [procname] ({self.hugepage_size_display} Transparent HugePages)", "PID", "Total THP", "Usage"))
+
+        # Group by parent process for cleaner output.
+        # THP is per-process (private anonymous memory), so we sum all
+        # members' usage within each group rather than counting only once.
+        groups, pid_name = self.group_processes(pid_totals)
+
         results = []
         grand_total_kb = 0
 
@@ -316,9 +646,111 @@ class TransparentHugePagesAnalyzer:
             grand_total_display = self.format_size_display(grand_total_kb)
             grand_total_pages = grand_total_kb // self.hugepage_size_kb
             print(self.print_pattern % (f"TOTAL ({self.hugepage_size_display})", "", grand_total_display, f"{grand_total_pages} hugepages"))
+            self.display_reconciliation(grand_total_kb)
 
         self.debug_print(f"Transparent hugepage analysis completed: {len(results)} processes, {grand_total_display} total")
 
+    def watch_changes(self, pid_totals: Dict[str, int]):
+        """Resample every self.watch seconds, printing per-PID and system-wide changes"""
+        try:
+            while True:
+                time.sleep(self.watch)
+                # Status fields are refreshed for every sample
+                self.process_cache = {}
+                prev_counters, self.system_counters = self.system_counters, self.read_system_counters()
+                prev_time, self.counters_time = self.counters_time, time.monotonic()
+                self.rescan_all = self.thp_layout_changed(prev_counters, self.system_counters)
+                if self.rescan_all:
+                    self.debug_print("THP collapse/split counters changed, rescanning all processes")
+                prev_totals, pid_totals = pid_totals, self.scan_thp_processes()
+                self.display_changes(prev_totals, pid_totals, prev_counters, self.system_counters,
+                                     self.counters_time - prev_time)
+        except KeyboardInterrupt:
+            pass
+
+    def thp_layout_changed(self, prev_counters: Dict[str, int], counters: Dict[str, int]) -> bool:
+        """Whether THPs were collapsed or split between two counter samples"""
+        return any(counters.get(key) != prev_counters.get(key) for key in counters
+                   if key in self.layout_counters or key.startswith(self.layout_counter_prefix))
+
+    def display_changes(self, prev_totals: Dict[str, int], pid_totals: Dict[str, int],
+                        prev_counters: Dict[str, int], counters: Dict[str, int], elapsed: float):
+        """Display per-PID THP deltas and system counter deltas between two samples"""
+        total_kb = sum(pid_totals.values())
+        system_kb = self.read_meminfo_thp().get('AnonHugePages')
+        system_display = ""
+        if system_kb is not None:
+            system_display = (f", system {self.format_size_display(system_kb)} "
+                              f"(gap {self.format_delta(system_kb - total_kb)})")
+        print(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}: {len(pid_totals)} processes, "
+              f"{self.format_size_display(total_kb)} total THP{system_display}")
+
+        changes = []
+        for pid in set(prev_totals) | set(pid_totals):
+            delta_kb = pid_totals.get(pid, 0) - prev_totals.get(pid, 0)
+            if delta_kb:
+                changes.append((delta_kb, pid))
+        changes.sort(key=lambda x: abs(x[0]), reverse=True)
+
+        for delta_kb, pid in changes:
+            process_name = self.get_process_name(pid) or "(exited)"
+            display_name, pid_display, formatted_size = self.format_process_info(
+                pid, process_name, pid_totals.get(pid, 0))
+            print(self.print_pattern % (display_name, pid_display, formatted_size, self.format_delta(delta_kb)))
+
+        counter_deltas = [f"{key} {counters[key] - prev_counters[key]:+d}"
+                          f" ({(counters[key] - prev_counters[key]) / elapsed:.1f}/s)"
+                          for key in sorted(counters)
+                          if key in prev_counters and counters[key] != prev_counters[key] and elapsed > 0]
+        print(f"# counters: {', '.join(counter_deltas) if counter_deltas else 'no change'}")
+
+    def watch_system(self):
+        """Display system-wide THP usage and counters, with rates every self.watch seconds if set"""
+        prev_counters, prev_time = None, 0.0
+        try:
+            while True:
+                counters, now = self.read_system_counters(), time.monotonic()
+                self.display_system_summary(counters, prev_counters, now - prev_time)
+                if not self.watch:
+                    break
+                prev_counters, prev_time = counters, now
+                time.sleep(self.watch)
+        except KeyboardInterrupt:
+            pass
+
+    def display_system_summary(self, counters: Dict[str, int], prev_counters: Optional[Dict[str, int]],
+                               elapsed: float):
+        """Display /proc/meminfo huge page usage and THP event counters, with rates since the previous sample"""
+        print(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}: system THP usage")
+        for key, size_kb in self.read_meminfo_thp().items():
+            print(self.system_pattern % (key, self.format_size_display(size_kb),
+                                         f"{size_kb // self.hugepage_size_kb} hugepages"))
+        for key in self.summary_counters:
+            if key not in counters:
+                continue
+            rate_display = ""
+            if prev_counters and key in prev_counters and elapsed > 0:
+                rate_display = f"{(counters[key] - prev_counters[key]) / elapsed:.1f}/s"
+            print(self.system_pattern % (key, counters[key], rate_display))
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """HTTP handler serving the analyzer metrics in Prometheus text format"""
+    analyzer = None
+
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.analyzer.get_prometheus_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.analyzer.debug_print(f"{self.address_string()} {format % args}")
+
 def main():
     parser = argparse.ArgumentParser(
         description="List transparent hugepages in use on Linux systems",
@@ -327,17 +759,66 @@ def main():
 Examples:
   %(prog)s                    # Show transparent hugepage usage
   %(prog)s --debug            # Show with debug information
+  %(prog)s --efficiency       # Show THP coverage of KVM guests memory
+  %(prog)s --efficiency --numa  # Same, with anonymous memory per NUMA node
+  %(prog)s --watch 5          # Show THP changes every 5 seconds
+  %(prog)s --json             # Show THP usage as JSON
+  %(prog)s --jobs 8           # Read smaps of 8 processes in parallel
+  %(prog)s --system --watch 5 # Show system THP usage and event rates, no process scan
+  %(prog)s --exporter 9105    # Serve Prometheus metrics on localhost:9105
         """
     )
 
     parser.add_argument('--debug', action='store_true',
                        help='Enable debug output showing analysis details (prefixed with #)')
+    parser.add_argument('--efficiency', action='store_true',
+                       help='Show anonymous RSS, THP, coverage ratio and partially backed VMAs '
+                            '(partial/large) of KVM processes')
+    parser.add_argument('--numa', action='store_true',
+                       help='With --efficiency, also show anonymous memory per NUMA node from numa_maps')
+    parser.add_argument('--watch', type=int, metavar='N', default=0,
+                       help='Resample every N seconds, showing per-PID and khugepaged/vmstat changes')
+
+    parser.add_argument('--json', action='store_true',
+                       help='Output per-PID, per-group and total THP usage in kB as JSON')
+    parser.add_argument('--exporter', type=int, metavar='PORT', default=0,
+                       help='Serve metrics in Prometheus text format on localhost:PORT')
+    parser.add_argument('--cache-ttl', type=int, metavar='SECONDS', default=30,
+                       help='With --exporter, reuse the last scan for scrapes within SECONDS (default: 30)')
+
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                       help='Read smaps of N processes in parallel, largest (by RSS) first')
+    parser.add_argument('--system', action='store_true',
+                       help='Only show system-wide THP usage (/proc/meminfo) and event counters (/proc/vmstat), '
+                            'with rates when combined with --watch')
 
     args = parser.parse_args()
 
+    if sum(map(bool, (args.watch and not args.system, args.efficiency, args.json, args.exporter, args.system))) > 1:
+        parser.error("--watch, --efficiency, --json, --exporter and --system are mutually exclusive "
+                     "(except --system --watch)")
+    if args.exporter and not 1 <= args.exporter <= 65535:
+        parser.error(f"--exporter port must be in range 1-65535: {args.exporter}")
+    if args.cache_ttl < 0:
+        parser.error(f"--cache-ttl must not be negative: {args.cache_ttl}")
+    if args.numa and not args.efficiency:
+        parser.error("--numa requires --efficiency")
+    if args.watch < 0:
+        parser.error(f"--watch interval must be positive: {args.watch}")
+    if args.jobs < 1:
+        parser.error(f"--jobs must be at least 1: {args.jobs}")
+
     # Create and configure analyzer
     analyzer = TransparentHugePagesAnalyzer()
     analyzer.debug = args.debug
+    analyzer.efficiency = args.efficiency
+    analyzer.numa = args.numa
+    analyzer.watch = args.watch
+    analyzer.json_output = args.json
+    analyzer.exporter_port = args.exporter
+    analyzer.cache_ttl = args.cache_ttl
+    analyzer.system_only = args.system
+    analyzer.jobs = args.jobs
 
     # Run analysis
     analyzer.run()
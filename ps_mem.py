@@ -61,10 +61,15 @@
 # us to calculate a more accurate value for the total RAM used by programs.
 #
 # Programs that use CLONE_VM without CLONE_THREAD are discounted by assuming
-# they're the only programs that have the same /proc/$PID/smaps file for
-# each instance.  This will fail if there are multiple real instances of a
-# program that then use CLONE_VM without CLONE_THREAD, or if a clone changes
-# its memory map while we're checksumming each /proc/$PID/smaps.
+# they're the only programs whose instances share the same mm layout, as
+# reported by the code/data/brk/stack/arg/env addresses in /proc/$PID/stat.
+# Those addresses also coincide for children forked without exec (prefork
+# servers), so candidate groups are confirmed with kcmp(2) KCMP_VM, which
+# compares the mm itself.  Where kcmp is unavailable we fall back to
+# assuming they're the only programs that have the same /proc/$PID/smaps
+# file for each instance.  This will fail if there are multiple real
+# instances of a program that then use CLONE_VM without CLONE_THREAD, or
+# if a clone changes its memory map while we're comparing /proc/$PID/smaps.
 #
 # I don't take account of memory allocated for a program
 # by other programs. For e.g. memory used in the X server for
@@ -75,6 +80,7 @@
 
 import argparse
 import errno
+import json
 import os
 import sys
 import time
@@ -99,8 +105,13 @@ sys.excepthook = std_exceptions
 PAGESIZE = os.sysconf("SC_PAGE_SIZE") / 1024 #KiB
 our_pid = os.getpid()
 
+# Kernel capabilities, probed once at startup by probe_capabilities()
+kv = None
+have_smaps = 0
+have_smaps_rollup = 0
 have_pss = 0
 have_swap_pss = 0
+have_hugetlb = 0
 
 class Unbuffered(io.TextIOBase):
    def __init__(self, stream):
@@ -185,6 +196,56 @@ def parse_options():
         type=int,
         help='Measure and show process memory every N seconds',
     )
+    parser.add_argument(
+        '--top',
+        metavar='<N>',
+        type=int,
+        help='Only show the N programs using the most RAM, skipping the '
+             'detailed scan of processes that cannot be among them '
+             '(from an upper bound of their RSS)',
+    )
+    parser.add_argument(
+        '-N', '--numa',
+        dest='show_numa',
+        action='store_true',
+        help='Show resident memory per NUMA node, from /proc/<pid>/numa_maps '
+             '(pages shared between processes are counted for each of them)',
+    )
+    parser.add_argument(
+        '--numa-min',
+        metavar='<MiB>',
+        type=int,
+        default=0,
+        help='Only read numa_maps of processes using at least this much RAM '
+             '(default: %(default)s)',
+    )
+    parser.add_argument(
+        '--record',
+        dest='record_file',
+        metavar='<file>',
+        help='Append a timestamped sample per program to <file> instead of '
+             'showing it (use with -w to sample periodically)',
+    )
+    parser.add_argument(
+        '--record-size',
+        metavar='<KiB>',
+        type=int,
+        default=10240,
+        help='Maximum size of the --record file, oldest samples are '
+             'dropped beyond it (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--report',
+        dest='report_file',
+        metavar='<file>',
+        help='Show memory growth rate per program from a --record file',
+    )
+    parser.add_argument(
+        '--since',
+        metavar='<N>',
+        type=int,
+        help='Only consider --report samples from the last N seconds',
+    )
     args = parser.parse_args()
 
     args.pids_to_show = []
@@ -198,6 +259,22 @@ def parse_options():
         if args.watch <= 0:
             parser.error('Seconds must be positive! (%s)' % args.watch)
 
+    if args.top is not None and args.top <= 0:
+        parser.error('Number of programs must be positive! (%s)' % args.top)
+    if args.top is not None and args.only_total:
+        #the total of the skipped programs isn't known
+        parser.error('-t/--total cannot be used with --top')
+
+    if args.numa_min < 0:
+        parser.error('Size must not be negative! (%s)' % args.numa_min)
+
+    if args.record_size <= 0:
+        parser.error('Record size must be positive! (%s)' % args.record_size)
+    if args.since is not None and args.since <= 0:
+        parser.error('Seconds must be positive! (%s)' % args.since)
+    if args.record_file and args.report_file:
+        parser.error('--record and --report are mutually exclusive')
+
     return (
         args.split_args,
         args.pids_to_show,
@@ -205,9 +282,103 @@ def parse_options():
         args.only_total,
         args.discriminate_by_pid,
         args.show_swap,
+        args.record_file,
+        args.record_size * 1024,
+        args.report_file,
+        args.since,
+        args.top,
+        args.numa_min * 1024 if args.show_numa else None,
     )
 
 
+#return {node: resident KiB}
+#Note shared pages are counted in full for each process mapping them
+def getNumaStats(pid):
+    nodes = {}
+    for line in proc.open(pid, 'numa_maps'):
+        # <address> <policy> [file=...] [anon=N] ... [N<node>=<pages>] ...
+        node_pages = []
+        pagesize = PAGESIZE
+        for field in line.split()[2:]:
+            if field.startswith('kernelpagesize_kB='):
+                pagesize = int(field[18:])
+            elif field[0] == 'N':
+                node, _, pages = field[1:].partition('=')
+                if node.isdigit() and pages.isdigit():
+                    node_pages.append((int(node), int(pages)))
+        for node, pages in node_pages:
+            nodes[node] = nodes.get(node, 0) + pages * pagesize
+    return nodes
+
+
+def numa_nodes():
+    try:
+        nodes = os.listdir('/sys/devices/system/node')
+    except OSError:
+        return [0]
+    nodes = [int(n[4:]) for n in nodes if n.startswith('node') and n[4:].isdigit()]
+    return sorted(nodes) or [0]
+
+
+# Return a key identifying the mm of a process, cheap to compute.
+# CLONE_VM siblings share the mm, so they report the same start/end
+# addresses for code, data, brk, stack, args and environment in stat.
+def getMemId(pid):
+    stat = proc.open(pid, 'stat').read()
+    # Skip "pid (comm)" as comm can contain spaces
+    fields = stat[stat.rfind(')') + 2:].split()
+    # startcode,endcode,startstack (fields 26-28)
+    # start_data...env_end (fields 45-51, since 3.3 and 3.5)
+    return tuple(fields[23:26] + fields[42:49])
+
+
+# kcmp(2) syscall numbers by machine, and its type comparing the mm
+KCMP_SYSCALLS = {'x86_64': 312, 'i386': 349, 'i686': 349, 'aarch64': 272,
+                 'armv7l': 378, 'ppc64': 354, 'ppc64le': 354, 's390x': 343,
+                 'riscv64': 272}
+KCMP_VM = 1
+
+
+# Return 1 if both pids share one mm, 0 if not, -1 if a process is gone,
+# or None if kcmp is unavailable (old kernel, architecture, no ptrace access).
+def kcmpVm(pid1, pid2):
+    nr = KCMP_SYSCALLS.get(os.uname()[4])
+    if nr is None:
+        return None
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+    except (ImportError, OSError):
+        return None
+    ret = libc.syscall(nr, int(pid1), int(pid2), KCMP_VM, 0, 0)
+    if ret == -1:
+        if ctypes.get_errno() == errno.ESRCH:
+            return -1
+        return None
+    return int(ret == 0)
+
+
+# Return True if all pids really share one memory map.
+# Only called for candidate CLONE_VM groups, whose stat layouts match,
+# which forked children of one process do too.
+def sameMemMap(pids):
+    same = [kcmpVm(pids[0], pid) for pid in pids[1:]]
+    if None not in same:
+        return 0 not in same
+    # No kcmp: as processes sharing a mm report the same smaps,
+    # compare them as a whole
+    smaps = ('smaps', 'smaps_rollup')[have_smaps_rollup]
+    contents = {}
+    for pid in pids:
+        try:
+            contents[proc.open(pid, smaps).read()] = None
+        except LookupError:
+            continue #process gone
+        if len(contents) > 1:
+            return False
+    return True
+
+
 # (major,minor,release)
 def kernel_ver():
     kv = proc.open('sys/kernel/osrelease').readline().split(".")[:3]
@@ -226,12 +397,27 @@ def kernel_ver():
     return (int(kv[0]), int(kv[1]), int(kv[2]))
 
 
+#Probe once what the kernel reports in smaps, using our own process,
+#so that per process code paths and the final accuracy check don't have to.
+def probe_capabilities():
+    global kv, have_smaps, have_smaps_rollup
+    global have_pss, have_swap_pss, have_hugetlb
+    kv = kernel_ver()
+    have_smaps = int(os.path.exists(proc.path(our_pid, 'smaps')))
+    if not have_smaps:
+        return
+    have_smaps_rollup = int(os.path.exists(proc.path(our_pid, 'smaps_rollup')))
+    smaps = proc.open(our_pid, ('smaps', 'smaps_rollup')[have_smaps_rollup])
+    smaps = smaps.read()
+    have_pss = int(smaps.find("\nPss:") != -1)
+    have_swap_pss = int(smaps.find("\nSwapPss:") != -1)
+    have_hugetlb = int(smaps.find("\nPrivate_Hugetlb:") != -1)
+
+
 #return Private,Shared,Swap(Pss),unique_id
 #Note shared is always a subset of rss (trs is not always)
 def getMemStats(pid):
-    global have_pss
-    global have_swap_pss
-    mem_id = pid #unique
+    mem_id = getMemId(pid)
     Private_lines = []
     Shared_lines = []
     Private_huge_lines = []
@@ -244,32 +430,27 @@ def getMemStats(pid):
 
     Swap = 0
 
-    if os.path.exists(proc.path(pid, 'smaps')):  # stat
+    if have_smaps:
         smaps = 'smaps'
-        if os.path.exists(proc.path(pid, 'smaps_rollup')):
+        if have_smaps_rollup:
             smaps = 'smaps_rollup' # faster to process
         lines = proc.open(pid, smaps).readlines()  # open
-        # Note we checksum smaps as maps is usually but
-        # not always different for separate processes.
-        mem_id = hash(''.join(lines))
         for line in lines:
             # {Private,Shared}_Hugetlb is not included in Pss (why?)
             # so we need to account for separately.
-            if line.startswith("Private_Hugetlb:"):
+            if have_hugetlb and line.startswith("Private_Hugetlb:"):
                 Private_huge_lines.append(line)
-            elif line.startswith("Shared_Hugetlb:"):
+            elif have_hugetlb and line.startswith("Shared_Hugetlb:"):
                 Shared_huge_lines.append(line)
             elif line.startswith("Shared"):
                 Shared_lines.append(line)
             elif line.startswith("Private"):
                 Private_lines.append(line)
             elif line.startswith("Pss:"):
-                have_pss = 1
                 Pss_lines.append(line)
             elif line.startswith("Swap:"):
                 Swap_lines.append(line)
             elif line.startswith("SwapPss:"):
-                have_swap_pss = 1
                 Swap_pss_lines.append(line)
         Shared = sum([int(line.split()[1]) for line in Shared_lines])
         Private = sum([int(line.split()[1]) for line in Private_lines])
@@ -289,7 +470,7 @@ def getMemStats(pid):
         else:
             # Note that Swap = Private swap + Shared swap.
             Swap = sum([int(line.split()[1]) for line in Swap_lines])
-    elif (2,6,1) <= kernel_ver() <= (2,6,9):
+    elif (2,6,1) <= kv <= (2,6,9):
         Shared = 0 #lots of overestimation, but what can we do?
         Shared_huge = 0
         Private = Rss
@@ -400,26 +581,24 @@ def cmd_with_count(cmd, count):
 #-1= not available
 def val_accuracy(show_swap):
     """http://wiki.apache.org/spamassassin/TopSharedMemoryBug"""
-    kv = kernel_ver()
-    pid = os.getpid()
     swap_accuracy = -1
     if kv[:2] == (2,4):
         if proc.open('meminfo').read().find("Inact_") == -1:
             return 1, swap_accuracy
         return 0, swap_accuracy
     elif kv[:2] == (2,6):
-        if os.path.exists(proc.path(pid, 'smaps')):
+        if have_smaps:
             swap_accuracy = 1
-            if proc.open(pid, 'smaps').read().find("Pss:")!=-1:
+            if have_pss:
                 return 2, swap_accuracy
             else:
                 return 1, swap_accuracy
         if (2,6,1) <= kv <= (2,6,9):
             return -1, swap_accuracy
         return 0, swap_accuracy
-    elif kv[0] > 2 and os.path.exists(proc.path(pid, 'smaps')):
+    elif kv[0] > 2 and have_smaps:
         swap_accuracy = 1
-        if show_swap and proc.open(pid, 'smaps').read().find("SwapPss:")!=-1:
+        if show_swap and have_swap_pss:
             swap_accuracy = 2
         return 2, swap_accuracy
     else:
@@ -474,14 +653,32 @@ def show_val_accuracy( ram_inacc, swap_inacc, only_total, show_swap ):
             sys.exit(1)
 
 
+#Return an upper bound of the RAM used by pid, as reported by getMemStats,
+#using only small files. Hugetlb pages are not included in the statm RSS.
+#Pss (plus 0.5 rounding adjustment per smaps_rollup) never exceeds Rss,
+#but statm RSS is approximate: on kernels 6.2 to 6.15 it's read from per-CPU
+#counters without summing them, each CPU may hold up to 64 pages not yet added.
+RSS_SLACK = os.sysconf("SC_NPROCESSORS_CONF") * 64 * PAGESIZE #KiB
+def getMemBound(pid):
+    rss = int(proc.open(pid, 'statm').readline().split()[1]) * PAGESIZE
+    for line in proc.open(pid, 'status'):
+        if line.startswith('HugetlbPages:'):
+            return rss + RSS_SLACK + int(line.split()[1]) + 1
+    return float('inf') #hugetlb usage unknown, so can't be pruned
+
+
 def get_memory_usage(pids_to_show, split_args, discriminate_by_pid,
-                     include_self=False, only_self=False):
+                     include_self=False, only_self=False, top=None,
+                     numa_min=None):
     cmds = {}
+    numas = {}
     shareds = {}
     shared_huges = {}
     mem_ids = {}
+    pids = {}
     count = {}
     swaps = {}
+    cmd_pids = {}
     for pid in os.listdir(proc.path('')):
         if not pid.isdigit():
             continue
@@ -502,32 +699,23 @@ def get_memory_usage(pids_to_show, split_args, discriminate_by_pid,
             #kernel threads don't have exe links or
             #process gone
             continue
-
-        try:
-            private, shared, shared_huge, swap, mem_id = getMemStats(pid)
-        except RuntimeError:
-            continue #process gone
-        if shareds.get(cmd):
-            if have_pss: #add shared portion of PSS together
-                shareds[cmd] += shared
-            elif shareds[cmd] < shared: #just take largest shared val
-                shareds[cmd] = shared
-        else:
-            shareds[cmd] = shared
-        if shared_huges.get(cmd):
-            if shared_huges[cmd] < shared_huge: #just take largest shared_huge
-                shared_huges[cmd] = shared_huge
-        else:
-            shared_huges[cmd] = shared_huge
-        cmds[cmd] = cmds.setdefault(cmd, 0) + private
-        if cmd in count:
-            count[cmd] += 1
-        else:
-            count[cmd] = 1
-        mem_ids.setdefault(cmd, {}).update({mem_id: None})
-
-        # Swap (overcounting for now...)
-        swaps[cmd] = swaps.setdefault(cmd, 0) + swap
+        cmd_pids.setdefault(cmd, []).append(pid)
+
+    # With top, visit programs from the largest possible RAM used down, and
+    # stop reading smaps once no remaining program can enter the top rows.
+    # Bounds are only valid with smaps_rollup (a single Pss adjustment).
+    bounds = {}
+    if top and have_smaps_rollup:
+        for cmd, cpids in cmd_pids.items():
+            bound = 0
+            for pid in cpids:
+                try:
+                    bound += getMemBound(pid)
+                except LookupError:
+                    pass #process gone
+            bounds[cmd] = bound
+    to_visit = sorted(cmd_pids, key=lambda cmd: bounds.get(cmd, 0),
+                      reverse=True)
 
     # Total swaped mem for each program
     total_swap = 0
@@ -535,29 +723,83 @@ def get_memory_usage(pids_to_show, split_args, discriminate_by_pid,
     # Add shared mem for each program
     total = 0
 
-    for cmd in cmds:
+    top_used = []
+    for cmd in to_visit:
+        if bounds and len(top_used) >= top and bounds[cmd] < top_used[0]:
+            break
+
+        for pid in cmd_pids[cmd]:
+            try:
+                private, shared, shared_huge, swap, mem_id = getMemStats(pid)
+            except (LookupError, RuntimeError):
+                continue #process gone
+            if shareds.get(cmd):
+                if have_pss: #add shared portion of PSS together
+                    shareds[cmd] += shared
+                elif shareds[cmd] < shared: #just take largest shared val
+                    shareds[cmd] = shared
+            else:
+                shareds[cmd] = shared
+            if shared_huges.get(cmd):
+                if shared_huges[cmd] < shared_huge: #just take largest shared_huge
+                    shared_huges[cmd] = shared_huge
+            else:
+                shared_huges[cmd] = shared_huge
+            cmds[cmd] = cmds.setdefault(cmd, 0) + private
+            if cmd in count:
+                count[cmd] += 1
+            else:
+                count[cmd] = 1
+            mem_ids.setdefault(cmd, {}).update({mem_id: None})
+            pids.setdefault(cmd, []).append(pid)
+
+            # Swap (overcounting for now...)
+            swaps[cmd] = swaps.setdefault(cmd, 0) + swap
+
+            # NUMA placement, only for large enough processes
+            if numa_min is not None and private + shared + shared_huge >= numa_min:
+                try:
+                    nodes = getNumaStats(pid)
+                except LookupError:
+                    continue #process gone
+                cmd_nodes = numas.setdefault(cmd, {})
+                for node, used in nodes.items():
+                    cmd_nodes[node] = cmd_nodes.get(node, 0) + used
+
+        if cmd not in cmds:
+            continue #all processes gone
         cmd_count = count[cmd]
-        if len(mem_ids[cmd]) == 1 and cmd_count > 1:
+        if len(mem_ids[cmd]) == 1 and cmd_count > 1 and sameMemMap(pids[cmd]):
             # Assume this program is using CLONE_VM without CLONE_THREAD
             # so only account for one of the processes
             cmds[cmd] /= cmd_count
             if have_pss:
                 shareds[cmd] /= cmd_count
+            for node in numas.get(cmd, {}):
+                numas[cmd][node] /= cmd_count
         # overestimation possible if shared_huges shared across commands
         shareds[cmd] += shared_huges[cmd]
         cmds[cmd] = cmds[cmd] + shareds[cmd]
-        total += cmds[cmd]  # valid if PSS available
-        total_swap += swaps[cmd]
+        if top:
+            top_used = sorted(top_used + [cmds[cmd]])[-top:]
 
     sorted_cmds = sorted(cmds.items(), key=lambda x:x[1])
     sorted_cmds = [x for x in sorted_cmds if x[1]]
+    if top:
+        sorted_cmds = sorted_cmds[-top:]
+
+    for cmd, used in sorted_cmds:
+        total += used  # valid if PSS available
+        total_swap += swaps[cmd]
 
-    return sorted_cmds, shareds, count, total, swaps, total_swap
+    return sorted_cmds, shareds, count, total, swaps, total_swap, numas
 
-def print_header(show_swap, discriminate_by_pid):
+def print_header(show_swap, discriminate_by_pid, nodes=None):
     output_string = " Private  +   Shared  =  RAM used"
     if show_swap:
         output_string += "   Swap used"
+    for node in nodes or []:
+        output_string += "%12s" % ("Node %d" % node)
     output_string += "\tProgram"
     if discriminate_by_pid:
         output_string += "[pid]"
@@ -566,7 +808,7 @@ def print_header(show_swap, discriminate_by_pid):
 
 
 def print_memory_usage(sorted_cmds, shareds, count, total, swaps, total_swap,
-                       show_swap):
+                       show_swap, numas=None, nodes=None):
     for cmd in sorted_cmds:
 
         output_string = "%9s + %9s = %9s"
@@ -575,6 +817,12 @@ def print_memory_usage(sorted_cmds, shareds, count, total, swaps, total_swap,
         if show_swap:
             output_string += "   %9s"
             output_data += (human(swaps[cmd[0]]),)
+        for node in nodes or []:
+            output_string += "   %9s"
+            if cmd[0] in numas:
+                output_data += (human(numas[cmd[0]].get(node, 0)),)
+            else:
+                output_data += ("-",) #below --numa-min
         output_string += "\t%s\n"
         output_data += (cmd_with_count(cmd[0], count[cmd[0]]),)
 
@@ -590,6 +838,93 @@ def print_memory_usage(sorted_cmds, shareds, count, total, swaps, total_swap,
                          ("-" * 33, " " * 24, human(total), "=" * 33))
 
 
+#The history file holds one compact JSON sample per line:
+#{"t":<epoch>,"m":{"<program>":<RAM used KiB>,...}}
+#It's a ring buffer, so once it grows past max_size the oldest
+#samples are dropped, leaving room for more appends before the next trim.
+def record_sample(record_file, sorted_cmds, max_size):
+    sample = {'t': int(time.time()),
+              'm': dict((cmd, int(mem)) for cmd, mem in sorted_cmds)}
+    with open(record_file, 'a') as f:
+        f.write(json.dumps(sample, separators=(',', ':')) + '\n')
+    if os.path.getsize(record_file) > max_size:
+        trim_history(record_file, max_size * 3 // 4)
+
+
+def trim_history(record_file, keep_size):
+    lines = open(record_file).readlines()
+    keep = []
+    size = 0
+    for line in reversed(lines):
+        size += len(line)
+        if size > keep_size and keep: #always keep the newest sample
+            break
+        keep.append(line)
+    keep.reverse()
+    tmp_file = record_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.writelines(keep)
+    os.rename(tmp_file, record_file)
+
+
+def read_history(record_file, since):
+    samples = []
+    oldest = since and time.time() - since
+    try:
+        history = open(record_file)
+    except (IOError, OSError):
+        val = sys.exc_info()[1]
+        sys.stderr.write("Couldn't read history " + record_file + ": " +
+                         (val.strerror or str(val)) + "\n")
+        sys.exit(1)
+    for line in history:
+        try:
+            sample = json.loads(line)
+        except ValueError:
+            continue #partial line from an interrupted write
+        if oldest and sample['t'] < oldest:
+            continue
+        samples.append(sample)
+    history.close()
+    return samples
+
+
+#return [(cmd, first, last, growth per hour, monotonic), ...]
+#sorted by growth rate. Programs seen in less than 2 samples are ignored.
+def history_growth(samples):
+    series = {}
+    for sample in samples:
+        for cmd, mem in sample['m'].items():
+            series.setdefault(cmd, []).append((sample['t'], mem))
+    growth = []
+    for cmd, points in series.items():
+        (t_first, first), (t_last, last) = points[0], points[-1]
+        if t_last <= t_first:
+            continue
+        rate = (last - first) * 3600.0 / (t_last - t_first)
+        monotonic = last > first and all(
+            prev[1] <= cur[1] for prev, cur in zip(points, points[1:]))
+        growth.append((cmd, first, last, rate, monotonic))
+    growth.sort(key=lambda x: x[3])
+    return growth
+
+
+def print_history_report(samples, growth):
+    if len(samples) < 2:
+        sys.stdout.write("Not enough samples to report growth.\n")
+        return
+    sys.stdout.write("%d samples from %s to %s\n\n" % (
+        len(samples),
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(samples[0]['t'])),
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(samples[-1]['t']))))
+    sys.stdout.write("    First ->      Last =   Growth/h\tProgram\n\n")
+    for cmd, first, last, rate, monotonic in growth:
+        sign = ('+', '-')[rate < 0]
+        sys.stdout.write("%9s -> %9s = %10s\t%s%s\n" % (
+            human(first), human(last), sign + human(abs(rate)), cmd,
+            ("", " [monotonic]")[monotonic]))
+
+
 def verify_environment(pids_to_show):
     if os.geteuid() != 0 and not pids_to_show:
         sys.stderr.write("Sorry, root permission required, or specify pids with -p\n")
@@ -614,27 +949,56 @@ def main():
     sys.stderr = Unbuffered(sys.stderr)
 
     split_args, pids_to_show, watch, only_total, discriminate_by_pid, \
-    show_swap = parse_options()
+    show_swap, record_file, record_size, report_file, since, top, \
+    numa_min = parse_options()
+
+    if report_file:
+        samples = read_history(report_file, since)
+        print_history_report(samples, history_growth(samples))
+        sys.stdout.close()
+        return
 
     verify_environment(pids_to_show)
+    probe_capabilities()
+
+    if record_file:
+        try:
+            while True:
+                sorted_cmds = get_memory_usage(pids_to_show, split_args,
+                                               discriminate_by_pid,
+                                               top=top)[0]
+                record_sample(record_file, sorted_cmds, record_size)
+                if watch is None:
+                    break
+                time.sleep(watch)
+        except KeyboardInterrupt:
+            pass
+        sys.stdout.close()
+        return
+
+    nodes = None
+    if numa_min is not None:
+        nodes = numa_nodes()
 
     if not only_total:
-        print_header(show_swap, discriminate_by_pid)
+        print_header(show_swap, discriminate_by_pid, nodes)
 
     if watch is not None:
         try:
             sorted_cmds = True
             while sorted_cmds:
-                sorted_cmds, shareds, count, total, swaps, total_swap = \
-                    get_memory_usage(pids_to_show, split_args,
-                                     discriminate_by_pid)
+                sorted_cmds, shareds, count, total, swaps, total_swap, \
+                numas = get_memory_usage(pids_to_show, split_args,
+                                         discriminate_by_pid, top=top,
+                                         numa_min=numa_min)
                 if only_total and show_swap and have_swap_pss:
                     sys.stdout.write(human(total_swap, units=1)+'\n')
                 elif only_total and not show_swap and have_pss:
                     sys.stdout.write(human(total, units=1)+'\n')
                 elif not only_total:
                     print_memory_usage(sorted_cmds, shareds, count, total,
-                                       swaps, total_swap, show_swap)
+                                       swaps, total_swap, show_swap,
+                                       numas, nodes)
 
                 sys.stdout.flush()
                 time.sleep(watch)
@@ -644,16 +1008,16 @@ def main():
             pass
     else:
         # This is the default behavior
-        sorted_cmds, shareds, count, total, swaps, total_swap = \
+        sorted_cmds, shareds, count, total, swaps, total_swap, numas = \
             get_memory_usage(pids_to_show, split_args,
-                             discriminate_by_pid)
+                             discriminate_by_pid, top=top, numa_min=numa_min)
         if only_total and show_swap and have_swap_pss:
             sys.stdout.write(human(total_swap, units=1)+'\n')
         elif only_total and not show_swap and have_pss:
             sys.stdout.write(human(total, units=1)+'\n')
         elif not only_total:
             print_memory_usage(sorted_cmds, shareds, count, total, swaps,
-                               total_swap, show_swap)
+                               total_swap, show_swap, numas, nodes)
 
     # We must close explicitly, so that any EPIPE exception
     # is handled by our excepthook, rather than the default
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test script for the reclaim mode of lskfds.py
+
+Tests that the reclaim plan skips the killed files it must never truncate,
+and that truncating goes through a holder FD still open on the same file.
+
+Run as: python3 test_lskfds.py
+(Does not require root - uses synthetic killed files and this process's own FDs)
+"""
+
+import os
+import sys
+import tempfile
+
+from lskfds import KilledFileDescriptorsAnalyzer
+
+DISK_DEV = os.makedev(8, 2)
+
+
+def killed_file(inode, path, size, holders):
+    """Build a grouped killed file as group_killed_files() returns it"""
+    key = (DISK_DEV, inode) if inode is not None else (None, f"{holders[0][0]}/{holders[0][1]}")
+    return {'key': key, 'path': path, 'size': size,
+            'holders': [{'pid': pid, 'fd': fd, 'comm': comm, 'cmdline': comm, 'path': path,
+                         'key': key, 'size': size} for pid, fd, comm in holders]}
+
+
+def test_plan_reclaim():
+    """Test that each killed file gets the expected action."""
+    print("=" * 60)
+    print("Testing reclaim plan")
+    print("=" * 60)
+
+    analyzer = KilledFileDescriptorsAnalyzer()
+    analyzer.disk_devices = {DISK_DEV}
+    analyzer.protected.update({'4242', 'postgres'})
+    analyzer.mapped_inodes = {102}
+    analyzer.unreadable_keys = {(DISK_DEV, 103)}
+
+    test_cases = [
+        # (killed file, expected reason, description)
+        (killed_file(101, "/var/log/app.log", 4096, [('100', '3', 'app')]), None, "Plain deleted log"),
+        (killed_file(102, "/usr/lib64/libz.so.1", 8192, [('100', '4', 'app')]),
+         "mapped in memory", "Inode mapped in memory"),
+        (killed_file(103, "/mnt/nfs/data", 4096, [('100', '5', 'app')]),
+         "holder unreadable", "Held by an unreadable process"),
+        (killed_file(104, "/var/log/cron.log", 4096, [('4242', '3', 'crond')]),
+         "protected PID 4242", "Protected PID"),
+        (killed_file(105, "/var/lib/pgsql/wal", 4096, [('200', '7', 'postgres')]),
+         "protected PID 200", "Protected comm"),
+        (killed_file(106, "/var/log/empty.log", 0, [('100', '6', 'app')]),
+         "no space allocated", "Size 0"),
+        (killed_file(107, "/memfd:wayland-cursor", 4096, [('100', '8', 'app')]),
+         "not on disk", "memfd path"),
+        (killed_file(None, "/var/log/gone.log", 0, [('100', '9', 'app')]),
+         "not stat-able", "FD not stat-able"),
+    ]
+
+    plan = dict((entry['path'], reason) for entry, reason in
+                analyzer.plan_reclaim([entry for entry, _, _ in test_cases]))
+
+    all_passed = True
+    for entry, expected, description in test_cases:
+        result = plan[entry['path']]
+        status = "PASS" if result == expected else "FAIL"
+        if result != expected:
+            all_passed = False
+        print(f"  [{status}] {description}: '{entry['path']}' -> {result or 'truncate'}")
+
+    # A device missing from mountinfo is not on disk either (tmpfs, internal mounts)
+    analyzer.disk_devices = set()
+    result = analyzer.plan_reclaim([test_cases[0][0]])[0][1]
+    status = "PASS" if result == "not on disk" else "FAIL"
+    if result != "not on disk":
+        all_passed = False
+    print(f"  [{status}] Device not mounted from disk -> {result or 'truncate'}")
+
+    return all_passed
+
+
+def test_reclaim_files():
+    """Test truncating through a live FD, and skipping an FD reused since the scan."""
+    print("\n" + "=" * 60)
+    print("Testing reclaim through holder FDs")
+    print("=" * 60)
+
+    analyzer = KilledFileDescriptorsAnalyzer()
+    pid = str(os.getpid())
+    all_passed = True
+
+    # Two deleted files, held open by this process
+    fds = []
+    for _ in range(2):
+        fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(__file__)))
+        os.write(fd, b'x' * 65536)
+        os.fsync(fd)
+        os.unlink(path)
+        fds.append(fd)
+    try:
+        stats = [os.fstat(fd) for fd in fds]
+
+        # The first one is still behind its FD
+        live = killed_file(None, "/tmp/live", stats[0].st_blocks * 512, [(pid, str(fds[0]), 'python3')])
+        live['key'] = (stats[0].st_dev, stats[0].st_ino)
+
+        # The second one's FD now points to another file: its key is the scanned inode
+        reused = killed_file(None, "/tmp/reused", stats[1].st_blocks * 512, [(pid, str(fds[1]), 'python3')])
+        reused['key'] = (stats[1].st_dev, stats[1].st_ino + 1)
+
+        analyzer.reclaim_files([(live, None), (reused, None)])
+
+        size = os.fstat(fds[0]).st_size
+        status = "PASS" if size == 0 else "FAIL"
+        if size != 0:
+            all_passed = False
+        print(f"  [{status}] Live FD truncated: size {size}")
+
+        size = os.fstat(fds[1]).st_size
+        status = "PASS" if size == 65536 else "FAIL"
+        if size != 65536:
+            all_passed = False
+        print(f"  [{status}] Reused FD left alone: size {size}")
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    return all_passed
+
+
+def main():
+    print("\nlskfds.py Reclaim Test Suite")
+    print("=" * 60)
+
+    results = []
+    results.append(("Reclaim plan", test_plan_reclaim()))
+    results.append(("Reclaim through holder FDs", test_reclaim_files()))
+
+    print("\n" + "=" * 60)
+    print("Summary")
+    print("=" * 60)
+
+    all_passed = True
+    for name, passed in results:
+        status = "PASS" if passed else "FAIL"
+        if not passed:
+            all_passed = False
+        print(f"  [{status}] {name}")
+
+    print("\n" + "=" * 60)
+    if all_passed:
+        print("All tests PASSED!")
+        return 0
+    else:
+        print("Some tests FAILED!")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())